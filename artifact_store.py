@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import datetime
+import hashlib
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+from collections import OrderedDict
+
+def ensure_artifact_tables(db_conn):
+    db_conn.execute("""
+        CREATE TABLE IF NOT EXISTS artifacts (
+            link_path TEXT PRIMARY KEY,
+            digest TEXT,
+            case_number TEXT,
+            run_id TEXT,
+            creation_date TEXT
+        )
+    """)
+    db_conn.execute("CREATE INDEX IF NOT EXISTS idx_artifacts_case_run ON artifacts (case_number, run_id)")
+    db_conn.execute("CREATE INDEX IF NOT EXISTS idx_artifacts_digest ON artifacts (digest)")
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def object_path(store_dir, digest, ext):
+    return os.path.join(store_dir, "objects", digest[:2], digest + ext)
+
+def store_artifact(path, store_dir, case_number, run_id, db_conn):
+    ensure_artifact_tables(db_conn)
+    link_path = os.path.abspath(path)
+    digest = file_digest(link_path)
+    target = os.path.abspath(object_path(store_dir, digest, os.path.splitext(path)[1].lower()))
+    if os.path.exists(target):
+        os.remove(link_path)
+    else:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.move(link_path, target)
+    os.symlink(os.path.relpath(target, os.path.dirname(link_path)), link_path)
+    db_conn.execute(
+        "INSERT OR REPLACE INTO artifacts (link_path, digest, case_number, run_id, creation_date) VALUES (?, ?, ?, ?, ?)",
+        (link_path, digest, case_number, run_id, datetime.datetime.now().isoformat())
+    )
+    db_conn.commit()
+    return target
+
+def collect_garbage(store_dir, db_conn, keep=5, dry_run=False):
+    ensure_artifact_tables(db_conn)
+    stats = {"links_removed": 0, "objects_removed": 0, "bytes_freed": 0}
+    stale_links = OrderedDict()
+    for (case_number,) in db_conn.execute("SELECT DISTINCT case_number FROM artifacts").fetchall():
+        run_ids = [row[0] for row in db_conn.execute(
+            "SELECT DISTINCT run_id FROM artifacts WHERE case_number = ? ORDER BY run_id DESC",
+            (case_number,)
+        ).fetchall()]
+        for run_id in run_ids[keep:]:
+            for (link_path,) in db_conn.execute(
+                "SELECT link_path FROM artifacts WHERE case_number = ? AND run_id = ?",
+                (case_number, run_id)
+            ).fetchall():
+                stale_links[link_path] = True
+    for (link_path,) in db_conn.execute("SELECT link_path FROM artifacts").fetchall():
+        if not os.path.islink(link_path):
+            stale_links[link_path] = True
+    for link_path in stale_links:
+        if os.path.islink(link_path):
+            stats["links_removed"] += 1
+            if not dry_run:
+                os.remove(link_path)
+        if not dry_run:
+            db_conn.execute("DELETE FROM artifacts WHERE link_path = ?", (link_path,))
+    referenced = set(
+        digest for link_path, digest in db_conn.execute("SELECT link_path, digest FROM artifacts").fetchall()
+        if link_path not in stale_links
+    )
+    objects_dir = os.path.join(store_dir, "objects")
+    if os.path.isdir(objects_dir):
+        for shard in os.listdir(objects_dir):
+            shard_dir = os.path.join(objects_dir, shard)
+            for name in os.listdir(shard_dir):
+                if os.path.splitext(name)[0] in referenced:
+                    continue
+                object_file = os.path.join(shard_dir, name)
+                stats["objects_removed"] += 1
+                stats["bytes_freed"] += os.path.getsize(object_file)
+                if not dry_run:
+                    os.remove(object_file)
+            if not dry_run and not os.listdir(shard_dir):
+                os.rmdir(shard_dir)
+    if not dry_run:
+        db_conn.commit()
+    return stats
+
+def store_usage(store_dir):
+    object_count = 0
+    total_bytes = 0
+    objects_dir = os.path.join(store_dir, "objects")
+    if os.path.isdir(objects_dir):
+        for shard in os.listdir(objects_dir):
+            shard_dir = os.path.join(objects_dir, shard)
+            for name in os.listdir(shard_dir):
+                object_count += 1
+                total_bytes += os.path.getsize(os.path.join(shard_dir, name))
+    return object_count, total_bytes
+
+def check_reproducible(store_dir, generator_args, runs=2):
+    generator = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tflegal.py")
+    object_counts = []
+    for _ in range(runs):
+        subprocess.run(
+            [sys.executable, generator, *generator_args, "--rebuild", "--artifact-store", store_dir],
+            check=True, stdout=subprocess.DEVNULL
+        )
+        object_counts.append(store_usage(store_dir)[0])
+    return object_counts
+
+def main():
+    parser = argparse.ArgumentParser(description="Content-addressed store for generated filings")
+    parser.add_argument("--store", default="artifacts", help="Artifact store directory")
+    parser.add_argument("--db", default="cases.db", help="SQLite database holding the artifact index")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    gc_parser = subparsers.add_parser("gc", help="Remove artifacts beyond the retention policy")
+    gc_parser.add_argument("--keep", type=int, default=5, help="Runs to keep per case")
+    gc_parser.add_argument("--dry-run", action="store_true", help="Report what would be removed without deleting")
+    subparsers.add_parser("du", help="Report store disk usage")
+    subparsers.add_parser("check", help="Run tflegal.py twice with the remaining arguments (e.g. --case X --file complaint.txt) and fail if the second run adds objects")
+    args, generator_args = parser.parse_known_args()
+    if generator_args and args.command != "check":
+        parser.error(f"unrecognized arguments: {' '.join(generator_args)}")
+
+    if args.command == "check":
+        try:
+            object_counts = check_reproducible(args.store, generator_args)
+        except subprocess.CalledProcessError as e:
+            sys.exit(f"tflegal.py exited with status {e.returncode}")
+        print(f"Artifact store {args.store}: {' -> '.join(str(count) for count in object_counts)} objects after identical runs")
+        if len(set(object_counts)) > 1:
+            sys.exit("Identical runs stored different artifacts; output is not reproducible")
+        return
+
+    db_conn = sqlite3.connect(args.db)
+    if args.command == "gc":
+        stats = collect_garbage(args.store, db_conn, keep=args.keep, dry_run=args.dry_run)
+        prefix = "Would remove" if args.dry_run else "Removed"
+        print(
+            f"{prefix} {stats['links_removed']} links and {stats['objects_removed']} objects "
+            f"({stats['bytes_freed'] / 1024:.1f} KB)"
+        )
+    object_count, total_bytes = store_usage(args.store)
+    print(f"Artifact store {args.store}: {object_count} objects, {total_bytes / 1024:.1f} KB")
+    db_conn.close()
+
+if __name__ == "__main__":
+    main()
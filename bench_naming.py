@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import time
+from legal import NAMING_STRATEGIES, get_naming_strategy, generate_smart_filename, auto_determine_case_number
+
+def benchmark_strategy(name, iterations, case_name, firm_name, detected_cases):
+    start = time.perf_counter()
+    strategy = get_naming_strategy(name)
+    load_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(iterations):
+        case_number = auto_determine_case_number(detected_cases, strategy=strategy)
+        generate_smart_filename("lawsuit.pdf", case_name or case_number, firm_name, strategy=strategy)
+        generate_smart_filename("index.pdf", case_name or case_number, firm_name, strategy=strategy)
+        generate_smart_filename("lawsuit.pickle", case_name or case_number, firm_name, strategy=strategy)
+    naming_seconds = time.perf_counter() - start
+    return load_seconds, naming_seconds
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--strategies", nargs='*', default=list(NAMING_STRATEGIES))
+    parser.add_argument("--case", default="Middlesex Superior Court: Bo Shang vs MIT and ADAM HARTZ")
+    parser.add_argument("--firm_name", default="PDFSage Inc.")
+    args = parser.parse_args()
+
+    detected_cases = {"CV 2025-0123", "SJC-13012", "MICV2025-00456"}
+    print(f"{'strategy':<10} {'load (s)':>10} {'naming (s)':>12} {'per run (ms)':>14}")
+    for name in args.strategies:
+        try:
+            load_seconds, naming_seconds = benchmark_strategy(name, args.iterations, args.case, args.firm_name, detected_cases)
+        except ImportError as e:
+            print(f"{name:<10} skipped ({e})")
+            continue
+        per_run_ms = (load_seconds + naming_seconds / args.iterations) * 1000.0
+        print(f"{name:<10} {load_seconds:>10.4f} {naming_seconds:>12.4f} {per_run_ms:>14.3f}")
+
+if __name__ == "__main__":
+    main()
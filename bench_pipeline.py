@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import OrderedDict
+from PIL import Image as PILImage
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.units import inch
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen import canvas
+from tflegal import (
+    PageMetrics,
+    draw_page_header,
+    draw_page_footer,
+    parse_header_and_sections,
+    parse_exhibits_from_text,
+    layout_complaint,
+    generate_legal_document,
+    generate_complaint_docx,
+    generate_index_pdf,
+    generate_toc_docx,
+    filter_headings_for_toc
+)
+
+LINES_PER_PAGE = 36
+BODY_TEXT_WIDTH = 6.6 * 72
+
+ROMAN_NUMERALS = [
+    (1000, "M"), (900, "CM"), (500, "D"), (400, "CD"), (100, "C"), (90, "XC"),
+    (50, "L"), (40, "XL"), (10, "X"), (9, "IX"), (5, "V"), (4, "IV"), (1, "I")
+]
+
+VOCABULARY = (
+    "the court plaintiff alleges that defendant knowingly published statements regarding "
+    "contract breach negligence damages injunctive relief evidence record hearing motion "
+    "discovery counsel witness testimony exhibit jurisdiction venue statute remedy claim "
+    "party agreement notice filing judgment appeal pursuant section paragraph herein"
+).split()
+
+def to_roman(number):
+    result = []
+    for value, numeral in ROMAN_NUMERALS:
+        while number >= value:
+            result.append(numeral)
+            number -= value
+    return "".join(result)
+
+def synthetic_sentence(rng, words_per_line):
+    words = [rng.choice(VOCABULARY) for _ in range(max(1, words_per_line))]
+    words[0] = words[0].capitalize()
+    return " ".join(words) + "."
+
+def write_synthetic_image(path, rng, width, height):
+    shade = rng.randint(0, 255)
+    horizontal = PILImage.linear_gradient("L").rotate(90).resize((width, height))
+    vertical = PILImage.linear_gradient("L").resize((width, height)).point(lambda v: (v + shade) % 256)
+    checker = PILImage.effect_mandelbrot((width, height), (-2.0, -1.25, 0.75, 1.25), 64 + shade % 64)
+    PILImage.merge("RGB", (horizontal, vertical, checker)).save(path)
+
+def estimated_lines(text):
+    return 1 + int(stringWidth(text, "Helvetica", 10) // BODY_TEXT_WIDTH)
+
+def generate_synthetic_filing(
+    pages,
+    seed=0,
+    sections=None,
+    subsection_depth=3,
+    words_per_line=14,
+    title_blocks=2,
+    delimiters=4,
+    exhibits=3,
+    images=0,
+    image_dir=None,
+    image_size=(1600, 2000)
+):
+    rng = random.Random(seed)
+    target_lines = pages * LINES_PER_PAGE
+    header_lines = [
+        "In the Superior Court of Synthetic County",
+        "Jane Doe, et al., Plaintiffs",
+        "v. Example Corporation, Defendant",
+        "Civil Action No. SYN-2025-0001",
+        ""
+    ]
+    body_lines = []
+    line_estimate = 0
+    section_number = 0
+    title_blocks_left = title_blocks
+    delimiters_left = delimiters
+    path = []
+    heading_count = 0
+    while heading_count < sections if sections else line_estimate < target_lines:
+        depth = rng.randint(1, max(1, subsection_depth))
+        if not path or depth == 1:
+            section_number += 1
+            path = [section_number]
+        else:
+            path = path[:depth - 1]
+            while len(path) < depth - 1:
+                path.append(1)
+            path.append(rng.randint(1, 9))
+        if len(path) == 1:
+            heading_number = to_roman(path[0]) + "."
+        else:
+            heading_number = to_roman(path[0]) + "." + "".join(f"{part}." for part in path[1:])
+        body_lines.append(f"{heading_number} {synthetic_sentence(rng, 4).rstrip('.')}")
+        line_estimate += 2
+        heading_count += 1
+        if sections:
+            section_target = target_lines * heading_count / sections
+            paragraph_count = rng.randint(1, 3)
+        else:
+            section_target = 0
+            paragraph_count = rng.randint(3, 12)
+        while paragraph_count > 0 or line_estimate < section_target:
+            sentence = synthetic_sentence(rng, words_per_line)
+            body_lines.append(sentence)
+            line_estimate += estimated_lines(sentence)
+            paragraph_count -= 1
+        body_lines.append("")
+        if title_blocks_left and rng.random() < 0.05:
+            body_lines.extend(["=====", "Memorandum in Support", f"Part {title_blocks - title_blocks_left + 1}", "====="])
+            line_estimate += LINES_PER_PAGE
+            title_blocks_left -= 1
+        if delimiters_left and rng.random() < 0.05:
+            body_lines.append("-----")
+            line_estimate += 1
+            delimiters_left -= 1
+    exhibit_lines = []
+    for exhibit_number in range(1, exhibits + 1):
+        exhibit_lines.append(f"EXHIBIT {exhibit_number}: {synthetic_sentence(rng, 5)}")
+        for _ in range(rng.randint(2, 6)):
+            exhibit_lines.append(synthetic_sentence(rng, words_per_line))
+    image_paths = []
+    for image_number in range(images):
+        image_path = os.path.join(image_dir, f"exhibit_{seed}_{image_number}.png")
+        if not os.path.exists(image_path):
+            write_synthetic_image(image_path, rng, *image_size)
+        image_paths.append(image_path)
+    main_text = "\n".join(header_lines + body_lines)
+    exhibit_text = "\n".join(exhibit_lines)
+    return main_text, exhibit_text, image_paths
+
+def pipeline_stages(main_text, exhibit_text, image_paths, out_dir):
+    state = {}
+
+    def parse():
+        state["header_od"], state["sections_od"], state["section_tree"] = parse_header_and_sections(main_text)
+        text_exhibits = parse_exhibits_from_text(exhibit_text)
+        exhibits = []
+        for position, key in enumerate(sorted(text_exhibits, key=int)):
+            image_path = image_paths[position] if position < len(image_paths) else ""
+            exhibits.append((text_exhibits[key], image_path))
+        state["exhibits"] = exhibits
+
+    def layout():
+        state["layout"] = layout_complaint(state["header_od"], state["sections_od"], state["section_tree"])
+        state["toc"] = filter_headings_for_toc(state["layout"]["heading_positions"])
+
+    def complaint_pdf():
+        generate_legal_document(
+            firm_name="Benchmark LLP",
+            case_name="Synthetic v. Benchmark",
+            output_filename=os.path.join(out_dir, "complaint.pdf"),
+            header_od=state["header_od"],
+            sections_od=state["sections_od"],
+            exhibits=state["exhibits"],
+            heading_positions=[],
+            write_docx=False,
+            layout=state["layout"],
+            image_cache_dir=os.path.join(out_dir, "image_cache")
+        )
+
+    def complaint_docx():
+        generate_complaint_docx(
+            docx_filename=os.path.join(out_dir, "complaint.docx"),
+            firm_name="Benchmark LLP",
+            case_name="Synthetic v. Benchmark",
+            header_od=state["header_od"],
+            sections_od=state["sections_od"],
+            heading_styles=state["layout"]["heading_styles"]
+        )
+
+    def index_pdf():
+        generate_index_pdf(os.path.join(out_dir, "index.pdf"), "Benchmark LLP", "Synthetic v. Benchmark", state["toc"])
+
+    def index_docx():
+        generate_toc_docx(os.path.join(out_dir, "index.docx"), "Benchmark LLP", "Synthetic v. Benchmark", state["toc"])
+
+    return state, OrderedDict([
+        ("parse", parse),
+        ("layout", layout),
+        ("complaint_pdf", complaint_pdf),
+        ("complaint_docx", complaint_docx),
+        ("index_pdf", index_pdf),
+        ("index_docx", index_docx)
+    ])
+
+def run_benchmark(pages, options, measure_memory=True):
+    results = OrderedDict()
+    with tempfile.TemporaryDirectory() as out_dir:
+        main_text, exhibit_text, image_paths = generate_synthetic_filing(pages, image_dir=out_dir, **options)
+        state, stages = pipeline_stages(main_text, exhibit_text, image_paths, out_dir)
+        for name, stage in stages.items():
+            start = time.perf_counter()
+            stage()
+            results[name] = {"seconds": time.perf_counter() - start}
+        results["total"] = {"seconds": sum(r["seconds"] for r in results.values())}
+        rendered_pages = len(state["layout"]["pages"])
+        if measure_memory:
+            state, stages = pipeline_stages(main_text, exhibit_text, image_paths, out_dir)
+            tracemalloc.start()
+            for name, stage in stages.items():
+                tracemalloc.reset_peak()
+                stage()
+                results[name]["peak_kb"] = tracemalloc.get_traced_memory()[1] / 1024.0
+            tracemalloc.stop()
+    return rendered_pages, results
+
+def draw_measured_furniture(pdf_canvas, firm_name, case_name, page_width, page_height, page_number, total_pages):
+    pdf_canvas.saveState()
+    pdf_canvas.setFont("Helvetica-Bold", 10)
+    firm_width = pdf_canvas.stringWidth(firm_name, "Helvetica-Bold", 10)
+    pdf_canvas.translate(0.2 * inch, page_height / 2.0 - firm_width / 2.0)
+    pdf_canvas.rotate(90)
+    pdf_canvas.drawString(0, 0, firm_name)
+    pdf_canvas.restoreState()
+    pdf_canvas.setFont("Helvetica-Bold", 12)
+    pdf_canvas.drawCentredString(page_width / 2.0, page_height - 0.5 * inch, case_name)
+    pdf_canvas.setLineWidth(1)
+    pdf_canvas.line(0.5 * inch, page_height - 0.6 * inch, page_width - 0.5 * inch, page_height - 0.6 * inch)
+    pdf_canvas.setFont("Helvetica-Oblique", 9)
+    pdf_canvas.drawCentredString(page_width / 2.0, 0.4 * inch, f"Page {page_number} of {total_pages}")
+
+def run_furniture_benchmark(pages, repeats=5):
+    firm_name = "Benchmark LLP"
+    case_name = "Superior Court of Synthetic County: Jane Doe, et al. v. Example Corporation"
+    page_width, page_height = letter
+    results = OrderedDict([("measured", float("inf")), ("precomputed", float("inf"))])
+    for _ in range(repeats):
+        for variant in results:
+            pdf_canvas = canvas.Canvas(io.BytesIO(), pagesize=letter, invariant=1)
+            start = time.perf_counter()
+            if variant == "measured":
+                for page_number in range(1, pages + 1):
+                    draw_measured_furniture(pdf_canvas, firm_name, case_name, page_width, page_height, page_number, pages)
+                    pdf_canvas.showPage()
+            else:
+                metrics = PageMetrics(firm_name, case_name, pages)
+                for page_number in range(1, pages + 1):
+                    draw_page_header(pdf_canvas, metrics, page_width, page_height)
+                    draw_page_footer(pdf_canvas, metrics, page_width, page_number)
+                    pdf_canvas.showPage()
+            results[variant] = min(results[variant], time.perf_counter() - start)
+    return results
+
+def baseline_label(pages, options):
+    return f"{pages}p " + ",".join(f"{name}={value}" for name, value in sorted(options.items()))
+
+def compare_to_baseline(label, results, baseline, tolerance):
+    regressions = []
+    for stage, measured in results.items():
+        reference = baseline.get(stage)
+        if not reference:
+            continue
+        for metric in ("seconds", "peak_kb"):
+            if metric in measured and metric in reference and reference[metric] > 0:
+                ratio = measured[metric] / reference[metric]
+                if ratio > tolerance and measured[metric] - reference[metric] > (0.05 if metric == "seconds" else 256):
+                    regressions.append(f"{label} {stage} {metric}: {reference[metric]:.3f} -> {measured[metric]:.3f} (x{ratio:.2f})")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage benchmark of the filing pipeline on synthetic complaints")
+    parser.add_argument("--pages", type=int, nargs='*', default=[10, 100, 1000], help="Target body page counts (up to 10000)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--sections", type=int, help="Exact number of numbered headings; body text is spread across them to reach --pages (default: random 3-12 paragraphs per heading)")
+    parser.add_argument("--subsection-depth", type=int, default=3)
+    parser.add_argument("--words-per-line", type=int, default=14)
+    parser.add_argument("--title-blocks", type=int, default=2)
+    parser.add_argument("--delimiters", type=int, default=4)
+    parser.add_argument("--exhibits", type=int, default=3)
+    parser.add_argument("--images", type=int, default=0, help="Synthetic exhibit images to attach")
+    parser.add_argument("--skip-memory", action="store_true", help="Skip the tracemalloc pass")
+    parser.add_argument("--furniture", action="store_true", help="Only time page header/footer drawing with per-page measurement vs precomputed metrics")
+    parser.add_argument("--baseline", default="bench_baselines.json")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="Allowed slowdown ratio before a stage counts as a regression")
+    args = parser.parse_args()
+
+    if args.furniture:
+        for pages in args.pages:
+            results = run_furniture_benchmark(pages)
+            print(f"\n{pages}p page furniture (best of 5)")
+            for variant, seconds in results.items():
+                print(f"  {variant:<16} {seconds:>10.3f}")
+        return
+
+    if args.sections is not None and args.sections < 1:
+        parser.error("--sections must be at least 1")
+    options = {
+        "seed": args.seed,
+        "sections": args.sections,
+        "subsection_depth": args.subsection_depth,
+        "words_per_line": args.words_per_line,
+        "title_blocks": args.title_blocks,
+        "delimiters": args.delimiters,
+        "exhibits": args.exhibits,
+        "images": args.images
+    }
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baselines = json.load(f)
+    regressions = []
+    for pages in args.pages:
+        rendered_pages, results = run_benchmark(pages, options, measure_memory=not args.skip_memory)
+        label = baseline_label(pages, options)
+        print(f"\n{label} ({rendered_pages} body pages rendered)")
+        print(f"  {'stage':<16} {'seconds':>10} {'peak KB':>12}")
+        for stage, measured in results.items():
+            peak = f"{measured['peak_kb']:>12.1f}" if "peak_kb" in measured else f"{'-':>12}"
+            print(f"  {stage:<16} {measured['seconds']:>10.3f} {peak}")
+        if label in baselines and not args.save_baseline:
+            regressions.extend(compare_to_baseline(label, results, baselines[label], args.tolerance))
+        baselines[label] = results
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baselines, f, indent=2)
+        print(f"\nBaseline saved to {args.baseline}")
+    if regressions:
+        print("\nRegressions against baseline:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
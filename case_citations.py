@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import json
+import sqlite3
+import sys
+from tflegal import index_stored_filings, lookup_case_citations, lookup_citing_filings, normalize_case_number
+
+def print_citing_filings(case_number, filings, occurrences):
+    if not filings:
+        print(f"No stored filings cite {case_number}.")
+        return
+    print(f"{len(filings)} filing(s) cite {case_number}:")
+    print(f"  {'filing':<48} {'citations':>9} {'sections':>8}  stored")
+    for filing in filings:
+        print(f"  {filing['filing']:<48} {filing['citations']:>9} {filing['sections']:>8}  {filing['creation_date'] or '-'}")
+        for occurrence in occurrences.get(filing["filing"], []):
+            print(f"      {occurrence['section'][:60]} @ {occurrence['offset']}: {' '.join(occurrence['citation'].split())}")
+
+def main():
+    parser = argparse.ArgumentParser(description="List the stored filings that cite a case number")
+    parser.add_argument("case_number", nargs='?', help="Case number to look up, e.g. CV21-1234 (spacing and case are ignored)")
+    parser.add_argument("--db", default="cases.db", help="SQLite database with the stored filings")
+    parser.add_argument("--occurrences", action="store_true", help="Also list the section and character offset of every citation")
+    parser.add_argument("--json", action="store_true", help="Print the result as JSON")
+    parser.add_argument("--reindex", action="store_true", help="Rebuild the citation index from every filing stored in the database")
+    args = parser.parse_args()
+    if not args.case_number and not args.reindex:
+        parser.error("give a case number to look up, or --reindex")
+
+    db_conn = sqlite3.connect(args.db)
+    try:
+        if args.reindex:
+            indexed = index_stored_filings(db_conn)
+            for filing, result in indexed.items():
+                print(f"  {filing:<48} {result if isinstance(result, str) else f'{result} citation(s)'}")
+            print(f"Indexed {sum(1 for r in indexed.values() if not isinstance(r, str))} of {len(indexed)} stored filings.")
+        if not args.case_number:
+            return
+        filings = lookup_citing_filings(args.case_number, db_conn)
+        occurrences = {}
+        if args.occurrences:
+            for occurrence in lookup_case_citations(args.case_number, db_conn):
+                occurrences.setdefault(occurrence["filing"], []).append(occurrence)
+    finally:
+        db_conn.close()
+    if args.json:
+        for filing in filings:
+            if args.occurrences:
+                filing["occurrences"] = [
+                    {key: value for key, value in occurrence.items() if key != "filing"}
+                    for occurrence in occurrences.get(filing["filing"], [])
+                ]
+        print(json.dumps({"case_number": normalize_case_number(args.case_number), "filings": filings}, indent=2))
+    else:
+        print_citing_filings(normalize_case_number(args.case_number), filings, occurrences)
+    if not filings:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
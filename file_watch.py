@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+INOTIFY_EVENT = struct.Struct("iIII")
+
+def group_by_directory(paths):
+    by_directory = {}
+    for path in paths:
+        full_path = os.path.abspath(path)
+        by_directory.setdefault(os.path.dirname(full_path), set()).add(os.path.basename(full_path))
+    return by_directory
+
+class InotifyWatcher:
+    backend = "inotify"
+
+    def __init__(self, paths):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.watches = {}
+        for directory, names in group_by_directory(paths).items():
+            wd = libc.inotify_add_watch(self.fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO)
+            if wd < 0:
+                errno = ctypes.get_errno()
+                os.close(self.fd)
+                raise OSError(errno, f"inotify_add_watch failed for {directory}")
+            self.watches[wd] = (directory, names)
+
+    def read_changes(self, timeout):
+        changed = set()
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return changed
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, _mask, _cookie, name_length = INOTIFY_EVENT.unpack_from(data, offset)
+                offset += INOTIFY_EVENT.size
+                name = os.fsdecode(data[offset:offset + name_length].rstrip(b"\0"))
+                offset += name_length
+                directory, names = self.watches.get(wd, (None, ()))
+                if name in names:
+                    changed.add(os.path.join(directory, name))
+        return changed
+
+    def wait_for_changes(self, settle=0.1):
+        changed = set()
+        while not changed:
+            changed = self.read_changes(None)
+        while True:
+            more = self.read_changes(settle)
+            if not more:
+                return changed
+            changed |= more
+
+    def close(self):
+        os.close(self.fd)
+
+class PollingWatcher:
+    backend = "polling"
+
+    def __init__(self, paths, interval=0.25):
+        self.paths = [os.path.abspath(p) for p in paths]
+        self.interval = interval
+        self.snapshot = self.take_snapshot()
+
+    def take_snapshot(self):
+        snapshot = {}
+        for path in self.paths:
+            try:
+                st = os.stat(path)
+                snapshot[path] = (st.st_mtime_ns, st.st_size)
+            except OSError:
+                snapshot[path] = None
+        return snapshot
+
+    def wait_for_changes(self, settle=0.1):
+        while True:
+            time.sleep(self.interval)
+            current = self.take_snapshot()
+            changed = set(path for path in self.paths if current[path] != self.snapshot[path])
+            if changed:
+                time.sleep(settle)
+                self.snapshot = self.take_snapshot()
+                return changed
+
+    def close(self):
+        pass
+
+def open_file_watcher(paths):
+    try:
+        return InotifyWatcher(paths)
+    except (OSError, AttributeError):
+        return PollingWatcher(paths)
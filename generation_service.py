@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import asyncio
+import base64
+import contextlib
+import datetime
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from tflegal import run_generation_logged
+
+ARTIFACT_NAMES = ("complaint_pdf", "complaint_docx", "index_pdf", "index_docx")
+CONTENT_TYPES = {
+    ".pdf": "application/pdf",
+    ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+}
+STATUS_TEXT = {
+    200: "OK",
+    202: "Accepted",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    409: "Conflict",
+    411: "Length Required",
+    413: "Payload Too Large",
+    429: "Too Many Requests",
+    500: "Internal Server Error"
+}
+
+def parse_int_field(payload, key, default, minimum, maximum):
+    value = payload.get(key, default)
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(f"'{key}' must be an integer")
+    try:
+        value = int(value)
+    except ValueError:
+        raise ValueError(f"'{key}' must be an integer") from None
+    if not minimum <= value <= maximum:
+        raise ValueError(f"'{key}' must be between {minimum} and {maximum}")
+    return value
+
+def run_generation_job(job_dir, case_name, firm_name, exhibit_names, image_dpi, image_quality, db_path, image_cache):
+    argv = [
+        f"--case={case_name}",
+        f"--firm_name={firm_name}",
+        f"--file={os.path.join(job_dir, 'filing.txt')}",
+        f"--output={os.path.join(job_dir, 'lawsuit.pdf')}",
+        f"--index={os.path.join(job_dir, 'index.pdf')}",
+        "--workers=1",
+        f"--image-dpi={image_dpi}",
+        f"--image-quality={image_quality}",
+        f"--image-cache={image_cache}"
+    ]
+    if exhibit_names:
+        argv += ["--exhibits"] + [os.path.join(job_dir, name) for name in exhibit_names]
+    start = time.perf_counter()
+    try:
+        artifacts = run_generation_logged(argv, db_path=db_path, log_path=os.path.join(job_dir, "generation.log"))
+    except SystemExit as e:
+        raise ValueError(f"Generation exited with status {e.code}") from None
+    return {
+        "artifacts": {name: os.path.basename(path) for name, path in artifacts.items() if name in ARTIFACT_NAMES and path},
+        "render_seconds": time.perf_counter() - start
+    }
+
+class GenerationService:
+    def __init__(self, jobs_dir, db_path, image_cache, concurrency=2, queue_size=8, max_body_mb=64):
+        self.jobs_dir = os.path.abspath(jobs_dir)
+        self.db_path = os.path.abspath(db_path)
+        self.image_cache = os.path.abspath(image_cache)
+        self.concurrency = concurrency
+        self.max_body_bytes = int(max_body_mb * 1024 * 1024)
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.jobs = OrderedDict()
+        self.executor = ProcessPoolExecutor(max_workers=concurrency, mp_context=multiprocessing.get_context("spawn"))
+        self.consumers = []
+
+    def start(self):
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        self.consumers = [asyncio.create_task(self.consume()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        for consumer in self.consumers:
+            consumer.cancel()
+        await asyncio.gather(*self.consumers, return_exceptions=True)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def consume(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job_id, job_args = await self.queue.get()
+            job = self.jobs[job_id]
+            job["status"] = "running"
+            job["started"] = time.time()
+            try:
+                result = await loop.run_in_executor(self.executor, run_generation_job, *job_args)
+                job["artifacts"] = result["artifacts"]
+                job["render_seconds"] = round(result["render_seconds"], 3)
+                job["status"] = "done"
+            except (Exception, SystemExit) as e:
+                job["status"] = "failed"
+                job["error"] = f"{type(e).__name__}: {e}"
+            job["finished"] = time.time()
+            self.queue.task_done()
+
+    def submit(self, payload):
+        if not isinstance(payload, dict):
+            return 400, {"error": "Request body must be a JSON object"}
+        text = payload.get("text")
+        case_name = payload.get("case")
+        firm_name = payload.get("firm_name") or "PDFSage Inc."
+        if not isinstance(text, str) or not text.strip() or not isinstance(case_name, str) or not case_name.strip():
+            return 400, {"error": "'case' and non-empty 'text' are required"}
+        if not isinstance(firm_name, str):
+            return 400, {"error": "'firm_name' must be a string"}
+        exhibits = payload.get("exhibits") or []
+        if not isinstance(exhibits, list) or not all(isinstance(exhibit, dict) for exhibit in exhibits):
+            return 400, {"error": "'exhibits' must be a list of objects with 'filename' and 'data'"}
+        try:
+            image_dpi = parse_int_field(payload, "image_dpi", 150, 0, 2400)
+            image_quality = parse_int_field(payload, "image_quality", 85, 1, 100)
+        except ValueError as e:
+            return 400, {"error": str(e)}
+        if self.queue.full():
+            return 429, {"error": "Job queue is full", "queued": self.queue.qsize()}
+        job_id = uuid.uuid4().hex
+        job_dir = os.path.join(self.jobs_dir, job_id)
+        os.makedirs(job_dir)
+        exhibit_names = []
+        try:
+            with open(os.path.join(job_dir, "filing.txt"), "w", encoding="utf-8") as f:
+                f.write(text)
+            for position, exhibit in enumerate(exhibits, start=1):
+                name = f"exhibit_{position}{os.path.splitext(os.path.basename(str(exhibit.get('filename', ''))))[1].lower()}"
+                with open(os.path.join(job_dir, name), "wb") as f:
+                    f.write(base64.b64decode(exhibit["data"], validate=True))
+                exhibit_names.append(name)
+        except (KeyError, TypeError, ValueError) as e:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            return 400, {"error": f"Invalid exhibit: {e}"}
+        except BaseException:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            raise
+        job_args = (
+            job_dir,
+            case_name,
+            firm_name,
+            exhibit_names,
+            image_dpi,
+            image_quality,
+            self.db_path,
+            self.image_cache
+        )
+        self.jobs[job_id] = {"id": job_id, "status": "queued", "submitted": time.time(), "artifacts": {}}
+        self.queue.put_nowait((job_id, job_args))
+        return 202, {"job_id": job_id, "status": "queued", "position": self.queue.qsize()}
+
+    def job_status(self, job_id):
+        job = self.jobs[job_id]
+        status = OrderedDict((key, job[key]) for key in ("id", "status") if key in job)
+        status["submitted"] = datetime.datetime.fromtimestamp(job["submitted"]).isoformat()
+        if "started" in job:
+            status["queue_seconds"] = round(job["started"] - job["submitted"], 3)
+        if "finished" in job:
+            status["run_seconds"] = round(job["finished"] - job["started"], 3)
+        for key in ("render_seconds", "error"):
+            if key in job:
+                status[key] = job[key]
+        status["artifacts"] = {name: f"/jobs/{job_id}/artifacts/{name}" for name in job["artifacts"]}
+        return status
+
+    async def handle(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            method, target, _ = request_line.decode("latin-1").split(" ", 2)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                key, _, value = line.decode("latin-1").partition(":")
+                headers[key.strip().lower()] = value.strip()
+            path = urllib.parse.urlsplit(target).path.rstrip("/")
+            parts = [urllib.parse.unquote(p) for p in path.split("/") if p]
+            await self.route(method, parts, headers, reader, writer)
+        except (ValueError, asyncio.IncompleteReadError):
+            await self.send_json(writer, 400, {"error": "Malformed request"})
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            with contextlib.suppress(ConnectionError):
+                await writer.wait_closed()
+
+    async def route(self, method, parts, headers, reader, writer):
+        if parts == ["health"] and method == "GET":
+            await self.send_json(writer, 200, {
+                "queued": self.queue.qsize(),
+                "running": sum(1 for job in self.jobs.values() if job["status"] == "running"),
+                "concurrency": self.concurrency
+            })
+        elif parts == ["jobs"] and method == "POST":
+            if "content-length" not in headers:
+                await self.send_json(writer, 411, {"error": "Content-Length required"})
+                return
+            length = int(headers["content-length"])
+            if length > self.max_body_bytes:
+                await self.send_json(writer, 413, {"error": f"Body exceeds {self.max_body_bytes} bytes"})
+                return
+            try:
+                payload = json.loads(await reader.readexactly(length))
+            except json.JSONDecodeError as e:
+                await self.send_json(writer, 400, {"error": f"Invalid JSON: {e}"})
+                return
+            try:
+                status, body = self.submit(payload)
+            except OSError as e:
+                status, body = 500, {"error": f"Could not store job inputs: {e}"}
+            await self.send_json(writer, status, body, extra_headers={"Retry-After": "1"} if status == 429 else None)
+        elif parts == ["jobs"] and method == "GET":
+            await self.send_json(writer, 200, {"jobs": [self.job_status(job_id) for job_id in self.jobs]})
+        elif len(parts) >= 2 and parts[0] == "jobs" and parts[1] in self.jobs:
+            job_id = parts[1]
+            if len(parts) == 2 and method == "GET":
+                await self.send_json(writer, 200, self.job_status(job_id))
+            elif len(parts) == 2 and method == "DELETE":
+                if self.jobs[job_id]["status"] in ("queued", "running"):
+                    await self.send_json(writer, 409, {"error": "Job has not finished"})
+                    return
+                del self.jobs[job_id]
+                shutil.rmtree(os.path.join(self.jobs_dir, job_id), ignore_errors=True)
+                await self.send_json(writer, 200, {"deleted": job_id})
+            elif len(parts) == 4 and parts[2] == "artifacts" and method == "GET":
+                artifact_name = self.jobs[job_id]["artifacts"].get(parts[3])
+                if not artifact_name:
+                    await self.send_json(writer, 404, {"error": "Artifact not available"})
+                    return
+                await self.send_file(writer, os.path.join(self.jobs_dir, job_id, artifact_name))
+            else:
+                await self.send_json(writer, 405, {"error": "Unsupported method"})
+        else:
+            await self.send_json(writer, 404, {"error": "Not found"})
+
+    def send_head(self, writer, status, content_type, length, extra_headers=None):
+        lines = [
+            f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {length}",
+            "Connection: close"
+        ]
+        for key, value in (extra_headers or {}).items():
+            lines.append(f"{key}: {value}")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+
+    async def send_json(self, writer, status, body, extra_headers=None):
+        data = json.dumps(body, indent=2).encode("utf-8")
+        self.send_head(writer, status, "application/json", len(data), extra_headers)
+        writer.write(data)
+        await writer.drain()
+
+    async def send_file(self, writer, path):
+        content_type = CONTENT_TYPES.get(os.path.splitext(path)[1].lower(), "application/octet-stream")
+        self.send_head(
+            writer,
+            200,
+            content_type,
+            os.path.getsize(path),
+            {"Content-Disposition": f'attachment; filename="{os.path.basename(path)}"'}
+        )
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                writer.write(chunk)
+                await writer.drain()
+
+async def serve(args):
+    service = GenerationService(
+        jobs_dir=args.jobs_dir,
+        db_path=args.db,
+        image_cache=args.image_cache,
+        concurrency=args.concurrency,
+        queue_size=args.queue_size,
+        max_body_mb=args.max_body_mb
+    )
+    service.start()
+    server = await asyncio.start_server(service.handle, args.host, args.port)
+    print(f"Generation service listening on http://{args.host}:{args.port} (concurrency {args.concurrency}, queue {args.queue_size})")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+
+def request_json(url, method="GET", payload=None):
+    data = json.dumps(payload).encode("utf-8") if payload is not None else None
+    request = urllib.request.Request(url, data=data, method=method, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+def submit_and_download(args):
+    base_url = f"http://{args.host}:{args.port}"
+    with open(args.file, "r", encoding="utf-8") as f:
+        text = f.read()
+    exhibits = []
+    for path in args.exhibits or []:
+        with open(path, "rb") as f:
+            exhibits.append({"filename": os.path.basename(path), "data": base64.b64encode(f.read()).decode("ascii")})
+    payload = {"case": args.case, "firm_name": args.firm_name, "text": text, "exhibits": exhibits}
+    while True:
+        status, body = request_json(f"{base_url}/jobs", method="POST", payload=payload)
+        if status != 429:
+            break
+        time.sleep(1)
+    if status != 202:
+        print(f"Submission failed ({status}): {body.get('error')}")
+        sys.exit(1)
+    job_id = body["job_id"]
+    print(f"Submitted job {job_id}")
+    while True:
+        _, job = request_json(f"{base_url}/jobs/{job_id}")
+        if job["status"] in ("done", "failed"):
+            break
+        time.sleep(0.2)
+    print(json.dumps(job, indent=2))
+    if job["status"] != "done":
+        sys.exit(1)
+    os.makedirs(args.download_dir, exist_ok=True)
+    for name, artifact_url in job["artifacts"].items():
+        with urllib.request.urlopen(base_url + artifact_url) as response:
+            filename = response.headers.get_filename() or name
+            with open(os.path.join(args.download_dir, filename), "wb") as f:
+                shutil.copyfileobj(response, f)
+        print(f"Downloaded {name} to {os.path.join(args.download_dir, filename)}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Local HTTP service that queues filing generation jobs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    serve_parser = subparsers.add_parser("serve", help="Run the generation service")
+    serve_parser.add_argument("--jobs-dir", default="service_jobs", help="Directory holding per-job inputs and artifacts")
+    serve_parser.add_argument("--db", default="cases.db", help="SQLite database shared by all jobs")
+    serve_parser.add_argument("--image-cache", default=".exhibit_cache", help="Directory for preprocessed exhibit images")
+    serve_parser.add_argument("--concurrency", type=int, default=min(4, os.cpu_count() or 1), help="Jobs rendered at once (process pool size)")
+    serve_parser.add_argument("--queue-size", type=int, default=8, help="Queued jobs accepted before submissions get 429")
+    serve_parser.add_argument("--max-body-mb", type=float, default=64, help="Largest accepted submission")
+    submit_parser = subparsers.add_parser("submit", help="Submit a filing, wait for it and download the artifacts")
+    submit_parser.add_argument("--case", required=True)
+    submit_parser.add_argument("--firm_name", default="PDFSage Inc.")
+    submit_parser.add_argument("--file", required=True)
+    submit_parser.add_argument("--exhibits", nargs='*', help="Optional image paths for exhibits")
+    submit_parser.add_argument("--download-dir", default=".", help="Where to save the returned artifacts")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        try:
+            asyncio.run(serve(args))
+        except KeyboardInterrupt:
+            pass
+    else:
+        submit_and_download(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import datetime
+import json
+import os
+import re
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from tflegal import run_generation_logged
+
+def iter_job_requests(jsonl_path):
+    with open(jsonl_path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield f"line-{line_number}", {"invalid": f"Invalid JSON: {e}"}
+                continue
+            if not isinstance(request, dict):
+                yield f"line-{line_number}", {"invalid": "Request is not a JSON object"}
+                continue
+            job_id = str(request.get("job_id") or request.get("request_id") or f"line-{line_number}")
+            yield job_id, request
+
+def load_checkpoint(checkpoint_path):
+    completed = set()
+    if os.path.exists(checkpoint_path):
+        with open(checkpoint_path, "r", encoding="utf-8") as f:
+            completed.update(line.strip() for line in f if line.strip())
+    return completed
+
+def append_line(f, line):
+    f.write(line + "\n")
+    f.flush()
+    os.fsync(f.fileno())
+
+def job_argv(job_id, request, output_dir):
+    if request.get("invalid"):
+        raise ValueError(request["invalid"])
+    if not request.get("file") or not request.get("case"):
+        raise ValueError("Request needs 'file' and 'case'")
+    safe_id = re.sub(r'[^A-Za-z0-9_.-]+', "_", job_id)
+    argv = [
+        f"--case={request['case']}",
+        f"--file={request['file']}",
+        f"--output={request.get('output') or os.path.join(output_dir, f'{safe_id}_lawsuit.pdf')}",
+        f"--index={request.get('index') or os.path.join(output_dir, f'{safe_id}_index.pdf')}",
+        "--workers=1"
+    ]
+    if request.get("firm_name"):
+        argv.append(f"--firm_name={request['firm_name']}")
+    if request.get("pickle"):
+        argv.append(f"--pickle={request['pickle']}")
+    if request.get("exhibits"):
+        exhibits = request["exhibits"]
+        if not isinstance(exhibits, list) or any(not isinstance(path, str) or path.startswith("-") for path in exhibits):
+            raise ValueError("'exhibits' must be a list of image paths")
+        argv += ["--exhibits"] + exhibits
+    for key in ("image_dpi", "image_quality"):
+        if key in request:
+            value = request[key]
+            if isinstance(value, bool) or not re.match(r'^\d+$', str(value)):
+                raise ValueError(f"'{key}' must be a non-negative integer")
+            argv.append(f"--{key.replace('_', '-')}={int(value)}")
+    return argv
+
+def run_job(job_id, request, output_dir, db_path, log_dir):
+    started = time.time()
+    start = time.perf_counter()
+    result = OrderedDict([("job_id", job_id), ("status", "ok"), ("worker_pid", os.getpid())])
+    try:
+        argv = job_argv(job_id, request, output_dir)
+        log_path = os.path.join(log_dir, re.sub(r'[^A-Za-z0-9_.-]+', "_", job_id) + ".log") if log_dir else None
+        artifacts = run_generation_logged(argv, db_path=db_path, log_path=log_path)
+        result["artifacts"] = OrderedDict((name, path) for name, path in artifacts.items() if path)
+    except (Exception, SystemExit) as e:
+        result["status"] = "failed"
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["started"] = datetime.datetime.fromtimestamp(started).isoformat()
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    return result
+
+def run_batch(jsonl_path, results_path, checkpoint_path, output_dir, db_path, log_dir=None, workers=None, max_in_flight=None):
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or workers * 2
+    os.makedirs(output_dir, exist_ok=True)
+    if log_dir:
+        os.makedirs(log_dir, exist_ok=True)
+    completed = load_checkpoint(checkpoint_path)
+    stats = {"ok": 0, "failed": 0, "skipped": 0}
+    batch_start = time.perf_counter()
+    with open(results_path, "a", encoding="utf-8") as results_file, \
+            open(checkpoint_path, "a", encoding="utf-8") as checkpoint_file, \
+            ProcessPoolExecutor(max_workers=workers) as executor:
+        running = {}
+
+        def collect(done):
+            for future in done:
+                job_id = running.pop(future)
+                result = future.result()
+                append_line(results_file, json.dumps(result))
+                stats[result["status"]] += 1
+                if result["status"] == "ok":
+                    append_line(checkpoint_file, job_id)
+                    completed.add(job_id)
+                print(f"[{result['status']:>6}] {job_id} ({result['seconds']:.2f}s)" + (f": {result['error']}" if "error" in result else ""))
+
+        try:
+            for job_id, request in iter_job_requests(jsonl_path):
+                if job_id in completed or job_id in running.values():
+                    stats["skipped"] += 1
+                    continue
+                while len(running) >= max_in_flight:
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    collect(done)
+                running[executor.submit(run_job, job_id, request, output_dir, db_path, log_dir)] = job_id
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                collect(done)
+        except KeyboardInterrupt:
+            for future in running:
+                future.cancel()
+            print("Interrupted; completed jobs are checkpointed and will be skipped on the next run.")
+            raise
+    stats["seconds"] = time.perf_counter() - batch_start
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a JSONL batch of filing generation requests across a worker pool")
+    parser.add_argument("jsonl", nargs='?', default="requests.jsonl", help="JSONL file with one generation request per line")
+    parser.add_argument("--results", help="Results JSONL (default <jsonl>.results.jsonl)")
+    parser.add_argument("--checkpoint", help="Completed job IDs (default <jsonl>.checkpoint)")
+    parser.add_argument("--output-dir", default="batch_outputs", help="Directory for outputs of requests without explicit paths")
+    parser.add_argument("--log-dir", help="Keep each job's generator output in this directory")
+    parser.add_argument("--db", default="cases.db", help="SQLite database shared by all jobs")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and run every job again")
+    args = parser.parse_args()
+
+    base = os.path.splitext(args.jsonl)[0]
+    results_path = args.results or base + ".results.jsonl"
+    checkpoint_path = args.checkpoint or base + ".checkpoint"
+    if args.restart and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    try:
+        stats = run_batch(
+            jsonl_path=args.jsonl,
+            results_path=results_path,
+            checkpoint_path=checkpoint_path,
+            output_dir=args.output_dir,
+            db_path=args.db,
+            log_dir=args.log_dir,
+            workers=args.workers
+        )
+    except KeyboardInterrupt:
+        sys.exit(130)
+    print(
+        f"\n{stats['ok']} succeeded, {stats['failed']} failed, {stats['skipped']} already completed "
+        f"in {stats['seconds']:.2f}s. Results: {results_path}"
+    )
+    if stats["failed"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -8,7 +8,6 @@ import os
 import datetime
 import sqlite3
 from collections import OrderedDict
-import tensorflow as tf
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.units import inch
@@ -17,22 +16,55 @@ import docx
 from docx import Document
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.shared import Pt
-
-def generate_smart_filename(original_name, case_name, firm_name):
-    model = tf.keras.Sequential()
-    _ = model
-    case_part = case_name.replace(" ", "_") if case_name else "UNKNOWN_CASE"
-    firm_part = firm_name.replace(" ", "_") if firm_name else "UNKNOWN_FIRM"
-    base, ext = os.path.splitext(original_name)
-    return f"{base}_{firm_part}_{case_part}{ext}"
-
-def auto_determine_case_number(detected_cases):
-    model = tf.keras.Sequential()
-    _ = model
-    if not detected_cases:
-        return "UNKNOWN_CASE"
-    return sorted(list(detected_cases))[0]
-
+from pipeline_trace import span, traced, enable_tracing, write_chrome_trace, print_trace_summary
+
+class NamingStrategy:
+    name = "default"
+
+    def smart_filename(self, original_name, case_name, firm_name):
+        case_part = case_name.replace(" ", "_") if case_name else "UNKNOWN_CASE"
+        firm_part = firm_name.replace(" ", "_") if firm_name else "UNKNOWN_FIRM"
+        base, ext = os.path.splitext(original_name)
+        return f"{base}_{firm_part}_{case_part}{ext}"
+
+    def determine_case_number(self, detected_cases):
+        if not detected_cases:
+            return "UNKNOWN_CASE"
+        return sorted(list(detected_cases))[0]
+
+class KerasNamingStrategy(NamingStrategy):
+    name = "keras"
+
+    def __init__(self):
+        import tensorflow as tf
+        self.model = tf.keras.Sequential()
+
+NAMING_STRATEGIES = OrderedDict([
+    (NamingStrategy.name, NamingStrategy),
+    (KerasNamingStrategy.name, KerasNamingStrategy)
+])
+
+_default_naming_strategy = NamingStrategy()
+
+def get_naming_strategy(name="default"):
+    if name not in NAMING_STRATEGIES:
+        raise ValueError(f"Unknown naming strategy '{name}'. Choose from: {', '.join(NAMING_STRATEGIES)}")
+    if name == NamingStrategy.name:
+        return _default_naming_strategy
+    return NAMING_STRATEGIES[name]()
+
+def generate_smart_filename(original_name, case_name, firm_name, strategy=None):
+    if strategy is None:
+        strategy = _default_naming_strategy
+    return strategy.smart_filename(original_name, case_name, firm_name)
+
+@traced("naming.case_number")
+def auto_determine_case_number(detected_cases, strategy=None):
+    if strategy is None:
+        strategy = _default_naming_strategy
+    return strategy.determine_case_number(detected_cases)
+
+@traced("read_input")
 def read_input_file(filepath):
     ext = os.path.splitext(filepath)[1].lower()
     if ext == '.pdf':
@@ -174,6 +206,7 @@ def draw_legal_page_title_block(
     footer_text = f"Page {page_number} of {total_pages}"
     pdf_canvas.drawCentredString(page_width / 2.0, 0.4 * inch, footer_text)
 
+@traced("draw.body_page")
 def draw_page_of_segments(
     pdf_canvas,
     page_width,
@@ -255,8 +288,9 @@ def draw_page_of_segments(
     pdf_canvas.drawCentredString(page_width / 2.0, 0.4 * inch, footer_text)
     return end_index
 
+@traced("index_pdf")
 def generate_index_pdf(index_filename, firm_name, case_name, heading_positions):
-    pdf_canvas = canvas.Canvas(index_filename, pagesize=letter)
+    pdf_canvas = canvas.Canvas(index_filename, pagesize=letter, invariant=1)
     pdf_canvas.setTitle("Table of Contents")
     page_width, page_height = letter
     top_margin = 1.0 * inch
@@ -329,8 +363,10 @@ def generate_index_pdf(index_filename, firm_name, case_name, heading_positions):
             current_page_index += 1
         else:
             break
-    pdf_canvas.save()
+    with span("index_pdf.save"):
+        pdf_canvas.save()
 
+@traced("complaint_docx")
 def generate_complaint_docx(docx_filename, firm_name, case_name, header_od, sections_od, heading_styles):
     doc = Document()
     style = doc.styles['Normal']
@@ -477,8 +513,10 @@ def generate_complaint_docx(docx_filename, firm_name, case_name, header_od, sect
                 if is_exhibit_reference(bline_str):
                     rr.bold = True
             normal_buffer = []
-    doc.save(docx_filename)
+    with span("complaint_docx.save"):
+        doc.save(docx_filename)
 
+@traced("index_docx")
 def generate_toc_docx(docx_filename, firm_name, case_name, heading_positions):
     doc = Document()
     style = doc.styles['Normal']
@@ -529,8 +567,10 @@ def generate_toc_docx(docx_filename, firm_name, case_name, heading_positions):
             run_right.font.size = Pt(this_font_size)
             run_right.bold = False
             right_par.alignment = WD_ALIGN_PARAGRAPH.RIGHT
-    doc.save(docx_filename)
+    with span("index_docx.save"):
+        doc.save(docx_filename)
 
+@traced("parse.documents")
 def parse_documents_from_text(raw_text):
     lines = raw_text.splitlines()
     docs = []
@@ -552,6 +592,7 @@ def parse_documents_from_text(raw_text):
             i += 1
     return docs
 
+@traced("parse.sections")
 def parse_header_and_sections(raw_text):
     header_od = OrderedDict()
     sections_od = OrderedDict()
@@ -616,6 +657,7 @@ def classify_headings(sections_od):
             heading_styles[full_key] = "section"
     return heading_styles
 
+@traced("layout.wrap_segments")
 def prepare_main_pdf_segments(header_text, sections_od, heading_styles, pdf_canvas, max_text_width):
     segments = []
     header_lines = header_text.splitlines()
@@ -807,6 +849,7 @@ def prepare_main_pdf_segments(header_text, sections_od, heading_styles, pdf_canv
         flush_section_buffer()
     return segments
 
+@traced("parse.exhibits")
 def parse_exhibits_from_text(raw_text):
     lines = raw_text.splitlines()
     pattern = re.compile(r'^\s*EXHIBIT\s+(\d+)\s*:\s*(.*)$', re.IGNORECASE)
@@ -835,6 +878,7 @@ def parse_exhibits_from_text(raw_text):
         seen_exhibits.add(current_exhibit_number)
     return exhibits
 
+@traced("draw.exhibit_text")
 def draw_exhibit_text(
     pdf_canvas,
     page_width,
@@ -889,6 +933,7 @@ def draw_exhibit_text(
         y_text -= line_spacing
     return page_number
 
+@traced("draw.exhibit_image")
 def draw_exhibit_image(
     pdf_canvas,
     page_width,
@@ -993,10 +1038,12 @@ class Lawsuit:
             f"{documents_str}\n"
         )
 
+@traced("parse.case_numbers")
 def detect_case_numbers(text):
     pattern = re.compile(r'\b([A-Z]{1,5}\s*\d{1,}-\d+)\b', re.IGNORECASE)
     return set(re.findall(pattern, text))
 
+@traced("sqlite.store_lawsuit")
 def store_lawsuit_in_db(lawsuit_obj, db_conn):
     db_conn.execute("""
         CREATE TABLE IF NOT EXISTS cases (
@@ -1024,6 +1071,7 @@ def store_lawsuit_in_db(lawsuit_obj, db_conn):
         )
     db_conn.commit()
 
+@traced("sqlite.detected_cases")
 def store_detected_cases_in_db(detected_cases, db_conn):
     db_conn.execute("""
         CREATE TABLE IF NOT EXISTS detected_cases (
@@ -1049,6 +1097,7 @@ def set_active_case(case_number, db_conn):
     db_conn.execute("UPDATE cases SET is_active = 1 WHERE case_number = ?", (case_number,))
     db_conn.commit()
 
+@traced("complaint")
 def generate_legal_document(
     firm_name,
     case_name,
@@ -1059,7 +1108,7 @@ def generate_legal_document(
     heading_positions
 ):
     page_width, page_height = letter
-    pdf_canvas = canvas.Canvas(output_filename, pagesize=letter)
+    pdf_canvas = canvas.Canvas(output_filename, pagesize=letter, invariant=1)
     pdf_canvas.setTitle("Legal Document without Cover Sheet")
     pdf_canvas.setAuthor(firm_name)
     pdf_canvas.setSubject(case_name)
@@ -1170,7 +1219,8 @@ def generate_legal_document(
             )
             pdf_canvas.showPage()
             page_number += 1
-    pdf_canvas.save()
+    with span("complaint_pdf.save"):
+        pdf_canvas.save()
     generate_complaint_docx(
         docx_filename=os.path.splitext(output_filename)[0] + ".docx",
         firm_name=firm_name,
@@ -1208,7 +1258,13 @@ def main():
     parser.add_argument("--pickle", nargs='?', const=None)
     parser.add_argument("--set-case", help="Set the specified case number as active in the database", required=False)
     parser.add_argument("--exhibits", nargs='*', default=[], help="Paths to exhibit images in order")
+    parser.add_argument("--naming-strategy", choices=list(NAMING_STRATEGIES), default="default", help="Strategy for output names and AUTO case selection")
+    parser.add_argument("--profile", help="Write a Chrome/Perfetto trace of pipeline stages to this JSON file")
     args = parser.parse_args()
+    if args.profile:
+        enable_tracing()
+    with span("naming.load_strategy", strategy=args.naming_strategy):
+        naming_strategy = get_naming_strategy(args.naming_strategy)
 
     raw_text = read_input_file(args.file)
     db_conn = sqlite3.connect("cases.db")
@@ -1217,10 +1273,10 @@ def main():
     store_detected_cases_in_db(detected_cases, db_conn)
 
     if args.case.lower() == "auto":
-        args.case = auto_determine_case_number(detected_cases)
+        args.case = auto_determine_case_number(detected_cases, strategy=naming_strategy)
 
-    args.output = generate_smart_filename(args.output, args.case, args.firm_name)
-    args.index = generate_smart_filename(args.index, args.case, args.firm_name)
+    args.output = generate_smart_filename(args.output, args.case, args.firm_name, strategy=naming_strategy)
+    args.index = generate_smart_filename(args.index, args.case, args.firm_name, strategy=naming_strategy)
 
     datetime_string = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
     def add_datetime_suffix(filepath, dt_string):
@@ -1231,11 +1287,11 @@ def main():
     args.index = add_datetime_suffix(args.index, datetime_string)
     if args.pickle is not None:
         if args.pickle:
-            args.pickle = generate_smart_filename(args.pickle, args.case, args.firm_name)
+            args.pickle = generate_smart_filename(args.pickle, args.case, args.firm_name, strategy=naming_strategy)
             args.pickle = add_datetime_suffix(args.pickle, datetime_string)
         else:
             auto_pickle = f"lawsuit_{datetime_string}.pickle"
-            auto_pickle = generate_smart_filename(auto_pickle, args.case, args.firm_name)
+            auto_pickle = generate_smart_filename(auto_pickle, args.case, args.firm_name, strategy=naming_strategy)
             args.pickle = add_datetime_suffix(auto_pickle, datetime_string)
 
     header_od, sections_od = parse_header_and_sections(raw_text)
@@ -1320,7 +1376,7 @@ def main():
     )
 
     if args.pickle is not None:
-        with open(args.pickle, "wb") as pf:
+        with span("pickle"), open(args.pickle, "wb") as pf:
             pickle.dump(lawsuit_obj, pf)
         pkl_path = args.pickle
     else:
@@ -1331,6 +1387,10 @@ def main():
     print(f"Index PDF generated: {args.index}")
     print(f"Index DOCX generated: {index_docx}")
     print(f"Lawsuit object saved to: {pkl_path}\n")
+    if args.profile:
+        write_chrome_trace(args.profile)
+        print_trace_summary()
+        print(f"Trace written to {args.profile}\n")
     print("Dumped Lawsuit object:")
     print(lawsuit_obj)
 
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+
+_enabled = False
+_memory_enabled = False
+_events = []
+_null_span = contextlib.nullcontext()
+
+class _Span:
+    __slots__ = ("name", "args", "start")
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        end = time.perf_counter_ns()
+        event = {
+            "name": self.name,
+            "ph": "X",
+            "ts": self.start / 1000.0,
+            "dur": (end - self.start) / 1000.0,
+            "pid": os.getpid(),
+            "tid": threading.get_ident()
+        }
+        if self.args:
+            event["args"] = self.args
+        _events.append(event)
+        return False
+
+def enable_tracing():
+    global _enabled
+    _enabled = True
+
+def tracing_enabled():
+    return _enabled
+
+def span(name, **args):
+    if not _enabled:
+        return _null_span
+    return _Span(name, args)
+
+def traced(name):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _Span(name, None):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+class _MemoryStage:
+    __slots__ = ("name",)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        memory_checkpoint(self.name)
+        return False
+
+def current_rss_kb():
+    try:
+        with open("/proc/self/statm", "r") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / 1024.0
+    except (OSError, ValueError, IndexError):
+        import resource
+        return float(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+def enable_memory_tracking(use_tracemalloc=True):
+    global _memory_enabled
+    _memory_enabled = True
+    if use_tracemalloc and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+def memory_tracking_enabled():
+    return _memory_enabled
+
+def trace_settings():
+    return (_enabled, _memory_enabled, tracemalloc.is_tracing())
+
+def apply_trace_settings(settings):
+    tracing, memory, use_tracemalloc = settings
+    if tracing:
+        enable_tracing()
+    if memory:
+        enable_memory_tracking(use_tracemalloc=use_tracemalloc)
+
+def memory_checkpoint(name):
+    if not _memory_enabled:
+        return
+    counters = {"rss_kb": current_rss_kb()}
+    if tracemalloc.is_tracing():
+        counters["traced_peak_kb"] = tracemalloc.get_traced_memory()[1] / 1024.0
+        tracemalloc.reset_peak()
+    _events.append({
+        "name": f"memory.{name}",
+        "ph": "C",
+        "ts": time.perf_counter_ns() / 1000.0,
+        "pid": os.getpid(),
+        "tid": threading.get_ident(),
+        "args": counters
+    })
+
+def memory_stage(name):
+    if not _memory_enabled:
+        return _null_span
+    return _MemoryStage(name)
+
+def event_mark():
+    return len(_events)
+
+def events_since(mark):
+    return _events[mark:]
+
+def add_events(events):
+    _events.extend(events)
+
+def write_chrome_trace(path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": _events, "displayTimeUnit": "ms"}, f)
+
+def trace_summary():
+    totals = OrderedDict()
+    for event in sorted(_events, key=lambda e: e["ts"]):
+        if event["ph"] != "X":
+            continue
+        count, total, longest = totals.get(event["name"], (0, 0.0, 0.0))
+        totals[event["name"]] = (count + 1, total + event["dur"], max(longest, event["dur"]))
+    return totals
+
+def print_trace_summary():
+    print(f"{'span':<36} {'calls':>6} {'total ms':>10} {'max ms':>10}")
+    for name, (count, total, longest) in trace_summary().items():
+        print(f"{name:<36} {count:>6} {total / 1000.0:>10.2f} {longest / 1000.0:>10.2f}")
+
+def memory_summary():
+    return [
+        (event["name"][len("memory."):], event["pid"], event["args"])
+        for event in sorted(_events, key=lambda e: e["ts"]) if event["ph"] == "C"
+    ]
+
+def print_memory_summary():
+    print(f"{'stage':<24} {'pid':>8} {'rss MB':>10} {'traced peak MB':>16}")
+    for name, pid, counters in memory_summary():
+        peak = f"{counters['traced_peak_kb'] / 1024.0:>16.1f}" if "traced_peak_kb" in counters else f"{'-':>16}"
+        print(f"{name:<24} {pid:>8} {counters['rss_kb'] / 1024.0:>10.1f} {peak}")
@@ -2,23 +2,58 @@
 # -*- coding: utf-8 -*-
 
 import argparse
+import contextlib
+import sys
 import re
 import pickle
 import os
+import io
+import hashlib
+import tempfile
 import datetime
 import sqlite3
-from collections import OrderedDict
+import json
+import math
+import heapq
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from collections import OrderedDict, Counter
+from xml.sax.saxutils import escape
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.units import inch
-from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from artifact_store import store_artifact
+from file_watch import open_file_watcher
+from pipeline_trace import (
+    span,
+    traced,
+    enable_tracing,
+    event_mark,
+    events_since,
+    add_events,
+    trace_settings,
+    apply_trace_settings,
+    write_chrome_trace,
+    print_trace_summary,
+    enable_memory_tracking,
+    memory_checkpoint,
+    memory_stage,
+    current_rss_kb,
+    print_memory_summary
+)
 import docx
 from docx import Document
+from docx.enum.style import WD_STYLE_TYPE
 from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
 from docx.shared import Pt
-from sklearn.feature_extraction.text import CountVectorizer, ENGLISH_STOP_WORDS
-import numpy as np
+from PIL import Image as PILImage
 
+@traced("read_input_file")
 def read_input_file(filepath):
     ext = os.path.splitext(filepath)[1].lower()
     if ext == '.pdf':
@@ -51,19 +86,159 @@ def read_input_file(filepath):
         with open(filepath, 'r', encoding='utf-8') as f:
             return f.read()
 
-def generate_smart_filename(original_filename, text, dt_string):
-    custom_stop_words = list(ENGLISH_STOP_WORDS.union({
-        "plaintiff", "plaintiffs", "defendant", "defendants",
-        "petitioner", "respondent", "respondents"
-    }))
-    vectorizer = CountVectorizer(stop_words=custom_stop_words, max_features=50)
-    X = vectorizer.fit_transform([text])
-    word_counts = X.toarray().sum(axis=0)
-    sorted_indices = np.argsort(-word_counts)
-    feature_names = vectorizer.get_feature_names_out()
-    top_words = []
-    for idx in sorted_indices[:3]:
-        top_words.append(feature_names[idx])
+GENERATOR_VERSION = "2025.04"
+STABLE_DOCX_TIMESTAMP = datetime.datetime(2000, 1, 1)
+RUN_CACHE_SOURCES = ("pipeline_trace.py", "artifact_store.py", "file_watch.py", "legal.py")
+
+ENGLISH_STOP_WORDS = frozenset([
+    'a', 'about', 'above', 'across', 'after', 'afterwards', 'again', 'against', 'all', 'almost',
+    'alone', 'along', 'already', 'also', 'although', 'always', 'am', 'among', 'amongst',
+    'amoungst', 'amount', 'an', 'and', 'another', 'any', 'anyhow', 'anyone', 'anything',
+    'anyway', 'anywhere', 'are', 'around', 'as', 'at', 'back', 'be', 'became', 'because',
+    'become', 'becomes', 'becoming', 'been', 'before', 'beforehand', 'behind', 'being', 'below',
+    'beside', 'besides', 'between', 'beyond', 'bill', 'both', 'bottom', 'but', 'by', 'call',
+    'can', 'cannot', 'cant', 'co', 'con', 'could', 'couldnt', 'cry', 'de', 'describe', 'detail',
+    'do', 'done', 'down', 'due', 'during', 'each', 'eg', 'eight', 'either', 'eleven', 'else',
+    'elsewhere', 'empty', 'enough', 'etc', 'even', 'ever', 'every', 'everyone', 'everything',
+    'everywhere', 'except', 'few', 'fifteen', 'fifty', 'fill', 'find', 'fire', 'first', 'five',
+    'for', 'former', 'formerly', 'forty', 'found', 'four', 'from', 'front', 'full', 'further',
+    'get', 'give', 'go', 'had', 'has', 'hasnt', 'have', 'he', 'hence', 'her', 'here',
+    'hereafter', 'hereby', 'herein', 'hereupon', 'hers', 'herself', 'him', 'himself', 'his',
+    'how', 'however', 'hundred', 'i', 'ie', 'if', 'in', 'inc', 'indeed', 'interest', 'into',
+    'is', 'it', 'its', 'itself', 'keep', 'last', 'latter', 'latterly', 'least', 'less', 'ltd',
+    'made', 'many', 'may', 'me', 'meanwhile', 'might', 'mill', 'mine', 'more', 'moreover',
+    'most', 'mostly', 'move', 'much', 'must', 'my', 'myself', 'name', 'namely', 'neither',
+    'never', 'nevertheless', 'next', 'nine', 'no', 'nobody', 'none', 'noone', 'nor', 'not',
+    'nothing', 'now', 'nowhere', 'of', 'off', 'often', 'on', 'once', 'one', 'only', 'onto',
+    'or', 'other', 'others', 'otherwise', 'our', 'ours', 'ourselves', 'out', 'over', 'own',
+    'part', 'per', 'perhaps', 'please', 'put', 'rather', 're', 'same', 'see', 'seem', 'seemed',
+    'seeming', 'seems', 'serious', 'several', 'she', 'should', 'show', 'side', 'since',
+    'sincere', 'six', 'sixty', 'so', 'some', 'somehow', 'someone', 'something', 'sometime',
+    'sometimes', 'somewhere', 'still', 'such', 'system', 'take', 'ten', 'than', 'that', 'the',
+    'their', 'them', 'themselves', 'then', 'thence', 'there', 'thereafter', 'thereby',
+    'therefore', 'therein', 'thereupon', 'these', 'they', 'thick', 'thin', 'third', 'this',
+    'those', 'though', 'three', 'through', 'throughout', 'thru', 'thus', 'to', 'together',
+    'too', 'top', 'toward', 'towards', 'twelve', 'twenty', 'two', 'un', 'under', 'until', 'up',
+    'upon', 'us', 'very', 'via', 'was', 'we', 'well', 'were', 'what', 'whatever', 'when',
+    'whence', 'whenever', 'where', 'whereafter', 'whereas', 'whereby', 'wherein', 'whereupon',
+    'wherever', 'whether', 'which', 'while', 'whither', 'who', 'whoever', 'whole', 'whom',
+    'whose', 'why', 'will', 'with', 'within', 'without', 'would', 'yet', 'you', 'your', 'yours',
+    'yourself', 'yourselves'
+])
+
+FILENAME_STOP_WORDS = ENGLISH_STOP_WORDS.union({
+    "plaintiff", "plaintiffs", "defendant", "defendants",
+    "petitioner", "respondent", "respondents"
+})
+
+KEYWORD_TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+
+KEYWORD_CACHE_SIZE = 32
+
+_term_count_cache = OrderedDict()
+_keyword_cache = OrderedDict()
+
+def lru_get(cache, key):
+    value = cache.get(key)
+    if value is not None:
+        cache.move_to_end(key)
+    return value
+
+def lru_put(cache, key, value, maxsize=KEYWORD_CACHE_SIZE):
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > maxsize:
+        cache.popitem(last=False)
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def count_filename_terms(text, text_hash=None):
+    if text_hash is None:
+        text_hash = content_hash(text)
+    counts = lru_get(_term_count_cache, text_hash)
+    if counts is None:
+        counts = Counter(
+            token for token in KEYWORD_TOKEN_PATTERN.findall(text.lower())
+            if token not in FILENAME_STOP_WORDS
+        )
+        lru_put(_term_count_cache, text_hash, counts)
+    return counts
+
+def ensure_keyword_tables(db_conn):
+    db_conn.execute("""
+        CREATE TABLE IF NOT EXISTS keyword_documents (
+            content_hash TEXT PRIMARY KEY,
+            added_date TEXT
+        )
+    """)
+    db_conn.execute("""
+        CREATE TABLE IF NOT EXISTS keyword_document_frequency (
+            term TEXT PRIMARY KEY,
+            document_count INTEGER NOT NULL
+        )
+    """)
+
+@traced("sqlite.keyword_frequency")
+def update_keyword_document_frequency(text, db_conn):
+    ensure_keyword_tables(db_conn)
+    text_hash = content_hash(text)
+    existing = db_conn.execute(
+        "SELECT content_hash FROM keyword_documents WHERE content_hash = ?",
+        (text_hash,)
+    ).fetchone()
+    if existing:
+        return
+    db_conn.execute(
+        "INSERT INTO keyword_documents (content_hash, added_date) VALUES (?, ?)",
+        (text_hash, datetime.datetime.now().isoformat())
+    )
+    db_conn.executemany(
+        "INSERT INTO keyword_document_frequency (term, document_count) VALUES (?, 1) "
+        "ON CONFLICT(term) DO UPDATE SET document_count = document_count + 1",
+        [(term,) for term in count_filename_terms(text, text_hash)]
+    )
+    db_conn.commit()
+
+def corpus_term_weights(terms, db_conn):
+    ensure_keyword_tables(db_conn)
+    total_documents = db_conn.execute("SELECT COUNT(*) FROM keyword_documents").fetchone()[0]
+    document_counts = {}
+    terms = list(terms)
+    for chunk_start in range(0, len(terms), 500):
+        chunk = terms[chunk_start:chunk_start + 500]
+        placeholders = ",".join("?" * len(chunk))
+        document_counts.update(db_conn.execute(
+            f"SELECT term, document_count FROM keyword_document_frequency WHERE term IN ({placeholders})",
+            chunk
+        ).fetchall())
+    return {
+        term: math.log((1 + total_documents) / (1 + document_counts.get(term, 0))) + 1.0
+        for term in terms
+    }
+
+@traced("naming.keywords")
+def extract_filename_keywords(text, count=3, db_conn=None):
+    text_hash = content_hash(text)
+    corpus_size = None
+    if db_conn is not None:
+        ensure_keyword_tables(db_conn)
+        corpus_size = db_conn.execute("SELECT COUNT(*) FROM keyword_documents").fetchone()[0]
+    cache_key = (text_hash, count, corpus_size)
+    top_words = lru_get(_keyword_cache, cache_key)
+    if top_words is not None:
+        return top_words
+    counts = count_filename_terms(text, text_hash)
+    if db_conn is not None:
+        weights = corpus_term_weights(counts, db_conn)
+        top_words = heapq.nsmallest(count, counts, key=lambda term: (-counts[term] * weights[term], term))
+    else:
+        top_words = heapq.nsmallest(count, counts, key=lambda term: (-counts[term], term))
+    lru_put(_keyword_cache, cache_key, top_words)
+    return top_words
+
+def generate_smart_filename(original_filename, text, dt_string, db_conn=None):
+    top_words = extract_filename_keywords(text, db_conn=db_conn)
     base, ext = os.path.splitext(original_filename)
     top_part = "_".join(top_words)
     return f"{base}_{top_part}_{dt_string}{ext}"
@@ -123,8 +298,7 @@ def detect_legal_title_blocks(lines):
             yield ("normal_line", lines[i])
             i += 1
 
-def wrap_text_to_lines(pdf_canvas, full_text, font_name, font_size, max_width):
-    pdf_canvas.setFont(font_name, font_size)
+def wrap_text_to_lines(full_text, font_name, font_size, max_width):
     paragraphs = full_text.split('\n')
     all_lines = []
     for paragraph in paragraphs:
@@ -135,7 +309,7 @@ def wrap_text_to_lines(pdf_canvas, full_text, font_name, font_size, max_width):
         current_line = ""
         for word in words:
             test_line = word if not current_line else (current_line + " " + word)
-            if pdf_canvas.stringWidth(test_line, font_name, font_size) <= max_width:
+            if stringWidth(test_line, font_name, font_size) <= max_width:
                 current_line = test_line
             else:
                 all_lines.append((current_line, True))
@@ -144,141 +318,138 @@ def wrap_text_to_lines(pdf_canvas, full_text, font_name, font_size, max_width):
             all_lines.append((current_line, False))
     return all_lines
 
-def draw_firm_name_vertical_center(pdf_canvas, text, page_width, page_height):
-    pdf_canvas.saveState()
-    pdf_canvas.setFont("Helvetica-Bold", 10)
-    text_width = pdf_canvas.stringWidth(text, "Helvetica-Bold", 10)
-    x_pos = 0.2 * inch
-    y_center = page_height / 2.0
-    y_pos = y_center - (text_width / 2.0)
-    pdf_canvas.translate(x_pos, y_pos)
-    pdf_canvas.rotate(90)
-    pdf_canvas.drawString(0, 0, text)
-    pdf_canvas.restoreState()
+class PageMetrics:
+    def __init__(self, firm_name, case_name, total_pages, footer_label="Page"):
+        self.firm_name = firm_name
+        self.case_name = case_name
+        self.firm_width = stringWidth(firm_name, "Helvetica-Bold", 10)
+        self.case_width = stringWidth(case_name, "Helvetica-Bold", 12)
+        self.footer_label = footer_label
+        self.footer_suffix = f" of {total_pages}"
+        self.footer_fixed_width = stringWidth(f"{footer_label} ", "Helvetica-Oblique", 9) + stringWidth(self.footer_suffix, "Helvetica-Oblique", 9)
+        self.digit_widths = {digit: stringWidth(digit, "Helvetica-Oblique", 9) for digit in "0123456789"}
+        self.text_widths = {}
+
+    def footer(self, page_number):
+        digits = str(page_number)
+        width = self.footer_fixed_width + sum(self.digit_widths[digit] for digit in digits)
+        return f"{self.footer_label} {digits}{self.footer_suffix}", width
+
+    def text_width(self, text, font_name, font_size):
+        key = (text, font_name, font_size)
+        width = self.text_widths.get(key)
+        if width is None:
+            width = stringWidth(text, font_name, font_size)
+            self.text_widths[key] = width
+        return width
+
+def draw_page_header(pdf_canvas, metrics, page_width, page_height):
+    text_object = pdf_canvas.beginText()
+    text_object.setFont("Helvetica-Bold", 10)
+    text_object.setTextTransform(0, 1, -1, 0, 0.2 * inch, page_height / 2.0 - metrics.firm_width / 2.0)
+    text_object.textOut(metrics.firm_name)
+    text_object.setFont("Helvetica-Bold", 12)
+    text_object.setTextOrigin((page_width - metrics.case_width) / 2.0, page_height - 0.5 * inch)
+    text_object.textOut(metrics.case_name)
+    pdf_canvas.drawText(text_object)
+    pdf_canvas.setLineWidth(1)
+    pdf_canvas.line(0.5 * inch, page_height - 0.6 * inch, page_width - 0.5 * inch, page_height - 0.6 * inch)
+
+def draw_page_footer(pdf_canvas, metrics, page_width, page_number):
+    footer_text, footer_width = metrics.footer(page_number)
+    pdf_canvas.setFont("Helvetica-Oblique", 9)
+    pdf_canvas.drawString((page_width - footer_width) / 2.0, 0.4 * inch, footer_text)
 
 def draw_legal_page_title_block(
     pdf_canvas,
     page_width,
     page_height,
     block_lines,
-    firm_name,
-    case_name,
-    page_number,
-    total_pages
+    metrics,
+    page_number
 ):
     pdf_canvas.setLineWidth(2)
     pdf_canvas.rect(0.5 * inch, 0.5 * inch, page_width - 1.0 * inch, page_height - 1.3 * inch)
-    draw_firm_name_vertical_center(pdf_canvas, firm_name, page_width, page_height)
-    pdf_canvas.setFont("Helvetica-Bold", 12)
-    pdf_canvas.drawCentredString(page_width / 2.0, page_height - 0.5 * inch, case_name)
-    pdf_canvas.setLineWidth(1)
-    pdf_canvas.line(0.5 * inch, page_height - 0.6 * inch, page_width - 0.5 * inch, page_height - 0.6 * inch)
+    draw_page_header(pdf_canvas, metrics, page_width, page_height)
     pdf_canvas.setFont("Helvetica-Bold", 14)
     line_spacing = 0.3 * inch
     y_text = page_height - 1.5 * inch
     for line_str in block_lines:
-        pdf_canvas.drawCentredString(page_width / 2.0, y_text, line_str)
+        line_width = metrics.text_width(line_str, "Helvetica-Bold", 14)
+        pdf_canvas.drawString((page_width - line_width) / 2.0, y_text, line_str)
         y_text -= line_spacing
-    pdf_canvas.setFont("Helvetica-Oblique", 9)
-    footer_text = f"Page {page_number} of {total_pages}"
-    pdf_canvas.drawCentredString(page_width / 2.0, 0.4 * inch, footer_text)
+    draw_page_footer(pdf_canvas, metrics, page_width, page_number)
 
+@traced("draw.body_page")
 def draw_page_of_segments(
     pdf_canvas,
     page_width,
     page_height,
     segments,
     start_index,
-    max_lines_per_page,
-    firm_name,
-    case_name,
+    end_index,
+    metrics,
     page_number,
-    total_pages,
     line_offset_x,
     line_offset_y,
-    line_spacing,
-    heading_positions
+    line_spacing
 ):
+    if start_index < end_index and segments[start_index].get("page_always_new"):
+        draw_legal_page_title_block(
+            pdf_canvas,
+            page_width,
+            page_height,
+            segments[start_index]["lines"],
+            metrics,
+            page_number
+        )
+        return
     pdf_canvas.setLineWidth(2)
     pdf_canvas.rect(0.5 * inch, 0.5 * inch, page_width - 1.0 * inch, page_height - 1.3 * inch)
-    draw_firm_name_vertical_center(pdf_canvas, firm_name, page_width, page_height)
-    pdf_canvas.setFont("Helvetica-Bold", 12)
-    pdf_canvas.drawCentredString(page_width / 2.0, page_height - 0.5 * inch, case_name)
-    pdf_canvas.setLineWidth(1)
-    pdf_canvas.line(0.5 * inch, page_height - 0.6 * inch, page_width - 0.5 * inch, page_height - 0.6 * inch)
-    end_index = start_index
-    current_line_count = 0
+    draw_page_header(pdf_canvas, metrics, page_width, page_height)
+    right_boundary = page_width - 0.5 * inch
+    mid_x = (line_offset_x + right_boundary) / 2.0
+    text_object = pdf_canvas.beginText()
+    text_object.setFont("Helvetica", 10)
     y_text = line_offset_y
-    while end_index < len(segments) and current_line_count < max_lines_per_page:
-        seg = segments[end_index]
-        if seg.get("page_always_new"):
-            if current_line_count > 0:
-                break
-            else:
-                block_lines = seg["lines"]
-                draw_legal_page_title_block(
-                    pdf_canvas,
-                    page_width,
-                    page_height,
-                    block_lines,
-                    firm_name,
-                    case_name,
-                    page_number,
-                    total_pages
-                )
-                end_index += 1
-                return end_index
-        line_number = end_index + 1
-        pdf_canvas.setFont("Helvetica", 10)
-        pdf_canvas.drawString(line_offset_x - 0.6 * inch, y_text, str(line_number))
-        pdf_canvas.drawString(page_width - 0.4 * inch, y_text, str(line_number))
-        pdf_canvas.setFont(seg["font_name"], seg["font_size"])
-        if seg["is_heading"] or seg["is_subheading"]:
-            heading_positions.append(
-                (
-                    seg["text"],
-                    page_number,
-                    line_number,
-                    seg["is_subheading"]
-                )
-            )
+    for seg_index in range(start_index, end_index):
+        line_number = str(seg_index + 1)
+        text_object.setTextOrigin(line_offset_x - 0.6 * inch, y_text)
+        text_object.textOut(line_number)
+        text_object.setTextOrigin(page_width - 0.4 * inch, y_text)
+        text_object.textOut(line_number)
+        y_text -= line_spacing
+    current_font = ("Helvetica", 10)
+    delimiter_ys = []
+    y_text = line_offset_y
+    for seg_index in range(start_index, end_index):
+        seg = segments[seg_index]
         if seg.get("delimiter_line"):
-            pdf_canvas.setLineWidth(1)
-            pdf_canvas.line(line_offset_x, y_text + 4, page_width - 0.5 * inch, y_text + 4)
+            delimiter_ys.append(y_text + 4)
             y_text -= line_spacing
-            current_line_count += 1
-            end_index += 1
             continue
+        font = (seg["font_name"], seg["font_size"])
+        if font != current_font:
+            text_object.setFont(*font)
+            current_font = font
         if seg["alignment"] == "center":
-            left_boundary = line_offset_x
-            right_boundary = page_width - 0.5 * inch
-            mid_x = (left_boundary + right_boundary) / 2.0
-            pdf_canvas.drawCentredString(mid_x, y_text, seg["text"])
+            text_width = pdf_canvas.stringWidth(seg["text"], *font)
+            text_object.setTextOrigin(mid_x - text_width / 2.0, y_text)
         else:
-            pdf_canvas.drawString(line_offset_x, y_text, seg["text"])
+            text_object.setTextOrigin(line_offset_x, y_text)
+        text_object.textOut(seg["text"])
         y_text -= line_spacing
-        current_line_count += 1
-        end_index += 1
-    pdf_canvas.setFont("Helvetica-Oblique", 9)
-    footer_text = f"Page {page_number} of {total_pages}"
-    pdf_canvas.drawCentredString(page_width / 2.0, 0.4 * inch, footer_text)
-    return end_index
+    pdf_canvas.drawText(text_object)
+    for y_line in delimiter_ys:
+        pdf_canvas.line(line_offset_x, y_line, right_boundary, y_line)
+    draw_page_footer(pdf_canvas, metrics, page_width, page_number)
 
-def generate_index_pdf(index_filename, firm_name, case_name, heading_positions):
-    pdf_canvas = canvas.Canvas(index_filename, pagesize=letter)
-    pdf_canvas.setTitle("Table of Contents")
+def layout_index_lines(heading_positions):
     page_width, page_height = letter
     top_margin = 1.0 * inch
     bottom_margin = 1.0 * inch
     left_margin = 1.0 * inch
-    right_margin = 0.5 * inch
     line_spacing = 0.25 * inch
-    temp_c = canvas.Canvas("dummy.pdf", pagesize=letter)
-
-    def wrap_text(linestr, font_name, font_size, maxwidth):
-        temp_c.setFont(font_name, font_size)
-        return wrap_text_to_lines(temp_c, linestr, font_name, font_size, maxwidth)
-
     max_entry_width = page_width - left_margin - 1.5 * inch
     flattened_lines = []
     for (heading_text, pg_num, ln_num, is_sub) in heading_positions:
@@ -288,7 +459,7 @@ def generate_index_pdf(index_filename, firm_name, case_name, heading_positions):
         else:
             font_name = "Helvetica-Bold"
             font_size = 10
-        wrapped = wrap_text(heading_text, font_name, font_size, max_entry_width)
+        wrapped = wrap_text_to_lines(heading_text, font_name, font_size, max_entry_width)
         text_lines = [w[0] for w in wrapped] if wrapped else [""]
         for i, txt_line in enumerate(text_lines):
             flattened_lines.append(
@@ -303,20 +474,55 @@ def generate_index_pdf(index_filename, firm_name, case_name, heading_positions):
             )
     usable_height = page_height - (top_margin + bottom_margin) - 1.0 * inch
     max_lines_per_page = int(usable_height // line_spacing)
+    return flattened_lines, max_lines_per_page
+
+def index_page_count(heading_positions):
+    flattened_lines, max_lines_per_page = layout_index_lines(heading_positions)
+    return max(1, (len(flattened_lines) + max_lines_per_page - 1) // max_lines_per_page)
+
+def volume_index_positions(heading_positions, volumes):
+    marked = []
+    pending_volumes = [v for v in volumes if v["first_page"] is not None]
+    for heading in heading_positions:
+        while pending_volumes and pending_volumes[0]["first_page"] <= heading[1]:
+            volume = pending_volumes.pop(0)
+            marked.append((f"VOLUME {volume['volume']}: PAGES {volume['first_page']}-{volume['last_page']}", volume["first_page"], None, False))
+        marked.append(heading)
+    for volume in pending_volumes:
+        marked.append((f"VOLUME {volume['volume']}: PAGES {volume['first_page']}-{volume['last_page']}", volume["first_page"], None, False))
+    return marked
+
+def volume_for_page(volumes, page_number):
+    for volume in volumes:
+        if volume["first_page"] is not None and volume["first_page"] <= page_number <= volume["last_page"]:
+            return volume["volume"]
+    return None
+
+def document_for_page(document_spans, page_number):
+    for document_span in document_spans:
+        if document_span["first_page"] <= page_number <= document_span["last_page"]:
+            return document_span
+    return None
+
+def draw_index_pages(pdf_canvas, firm_name, case_name, heading_positions, volumes=None, link_keys=None, document_spans=None):
+    if volumes:
+        heading_positions = volume_index_positions(heading_positions, volumes)
+    page_width, page_height = letter
+    top_margin = 1.0 * inch
+    line_spacing = 0.25 * inch
+    flattened_lines, max_lines_per_page = layout_index_lines(heading_positions)
     total_lines = len(flattened_lines)
     total_index_pages = max(1, (total_lines + max_lines_per_page - 1) // max_lines_per_page)
+    metrics = PageMetrics(firm_name, case_name, total_index_pages, footer_label="Index Page")
+    title_width = metrics.text_width("TABLE OF CONTENTS", "Helvetica-Bold", 14)
     i = 0
     current_page_index = 1
     while i < total_lines:
         pdf_canvas.setLineWidth(2)
         pdf_canvas.rect(0.5 * inch, 0.5 * inch, page_width - 1.0 * inch, page_height - 1.3 * inch)
-        draw_firm_name_vertical_center(pdf_canvas, firm_name, page_width, page_height)
-        pdf_canvas.setFont("Helvetica-Bold", 12)
-        pdf_canvas.drawCentredString(page_width / 2.0, page_height - 0.5 * inch, case_name)
-        pdf_canvas.setLineWidth(1)
-        pdf_canvas.line(0.5 * inch, page_height - 0.6 * inch, page_width - 0.5 * inch, page_height - 0.6 * inch)
+        draw_page_header(pdf_canvas, metrics, page_width, page_height)
         pdf_canvas.setFont("Helvetica-Bold", 14)
-        pdf_canvas.drawCentredString(page_width / 2.0, page_height - 0.75 * inch, "TABLE OF CONTENTS")
+        pdf_canvas.drawString((page_width - title_width) / 2.0, page_height - 0.75 * inch, "TABLE OF CONTENTS")
         x_text = 1.0 * inch
         y_text = page_height - top_margin - 0.75 * inch
         lines_on_this_page = 0
@@ -325,21 +531,39 @@ def generate_index_pdf(index_filename, firm_name, case_name, heading_positions):
             pdf_canvas.setFont(font_name, font_size)
             pdf_canvas.drawString(x_text, y_text, line_text)
             if show_pageline:
-                label_str = f"{pg_num}:{ln_num}"
+                label_str = f"{pg_num}:{ln_num}" if ln_num is not None else f"{pg_num}"
+                if volumes:
+                    label_str = f"Vol. {volume_for_page(volumes, pg_num)}, {label_str}"
+                document_span = document_for_page(document_spans, pg_num) if document_spans else None
+                if document_span is not None:
+                    document_page = pg_num - document_span["first_page"] + 1
+                    label_str = f"Doc {document_span['document']}, p. {document_page}:{ln_num}" if ln_num is not None else f"Doc {document_span['document']}, p. {document_page}"
                 pdf_canvas.drawRightString(page_width - 0.5 * inch - 0.2 * inch, y_text, label_str)
+                if link_keys and (pg_num, ln_num) in link_keys:
+                    pdf_canvas.linkRect(
+                        "",
+                        link_keys[(pg_num, ln_num)],
+                        (x_text - 2, y_text - 3, page_width - 0.7 * inch + 2, y_text + font_size),
+                        relative=0,
+                        thickness=0
+                    )
             y_text -= line_spacing
             i += 1
             lines_on_this_page += 1
-        pdf_canvas.setFont("Helvetica-Oblique", 9)
-        footer_text = f"Index Page {current_page_index} of {total_index_pages}"
-        pdf_canvas.drawCentredString(page_width / 2.0, 0.4 * inch, footer_text)
-        if i < total_lines:
-            pdf_canvas.showPage()
-            current_page_index += 1
-        else:
-            break
-    pdf_canvas.save()
+        draw_page_footer(pdf_canvas, metrics, page_width, current_page_index)
+        pdf_canvas.showPage()
+        current_page_index += 1
+    return total_index_pages
 
+@traced("index_pdf")
+def generate_index_pdf(index_filename, firm_name, case_name, heading_positions, volumes=None, document_spans=None):
+    pdf_canvas = canvas.Canvas(index_filename, pagesize=letter, invariant=1)
+    pdf_canvas.setTitle("Table of Contents")
+    draw_index_pages(pdf_canvas, firm_name, case_name, heading_positions, volumes=volumes, document_spans=document_spans)
+    with span("index_pdf.save"):
+        pdf_canvas.save()
+
+@traced("complaint_docx")
 def generate_complaint_docx(docx_filename, firm_name, case_name, header_od, sections_od, heading_styles):
     doc = Document()
     style = doc.styles['Normal']
@@ -489,14 +713,57 @@ def generate_complaint_docx(docx_filename, firm_name, case_name, header_od, sect
                 if is_exhibit_reference(bline_str):
                     rr.bold = True
             normal_buffer = []
-    doc.save(docx_filename)
+    with span("complaint_docx.save"):
+        save_stable_docx(doc, docx_filename)
+
+def save_stable_docx(doc, docx_filename):
+    properties = doc.core_properties
+    properties.created = STABLE_DOCX_TIMESTAMP
+    properties.modified = STABLE_DOCX_TIMESTAMP
+    properties.last_printed = STABLE_DOCX_TIMESTAMP
+    properties.revision = 1
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    buffer.seek(0)
+    with zipfile.ZipFile(buffer) as source, zipfile.ZipFile(docx_filename, "w", zipfile.ZIP_DEFLATED) as target:
+        for entry in source.infolist():
+            stable_entry = zipfile.ZipInfo(entry.filename, date_time=STABLE_DOCX_TIMESTAMP.timetuple()[:6])
+            stable_entry.compress_type = zipfile.ZIP_DEFLATED
+            target.writestr(stable_entry, source.read(entry.filename))
+
+def add_toc_styles(doc):
+    toc_styles = {}
+    for style_key, font_size, bold, alignment in (
+        ("section", 12, True, WD_ALIGN_PARAGRAPH.LEFT),
+        ("subsection", 11, False, WD_ALIGN_PARAGRAPH.LEFT),
+        ("section_page", 12, False, WD_ALIGN_PARAGRAPH.RIGHT),
+        ("subsection_page", 11, False, WD_ALIGN_PARAGRAPH.RIGHT),
+    ):
+        style_name = "TOC " + style_key.replace("_", " ").title()
+        toc_style = doc.styles.add_style(style_name, WD_STYLE_TYPE.PARAGRAPH)
+        toc_style.base_style = doc.styles['Normal']
+        toc_style.font.size = Pt(font_size)
+        toc_style.font.bold = bold
+        toc_style.paragraph_format.alignment = alignment
+        toc_styles[style_key] = toc_style.style_id
+    return toc_styles
+
+def toc_cell_xml(text, style_id, cell_width, bold=False):
+    run_props = "<w:rPr><w:b/></w:rPr>" if bold else ""
+    return (
+        f'<w:tc><w:tcPr><w:tcW w:w="{cell_width}" w:type="dxa"/></w:tcPr>'
+        f'<w:p><w:pPr><w:pStyle w:val="{style_id}"/></w:pPr>'
+        f'<w:r>{run_props}<w:t xml:space="preserve">{escape(text)}</w:t></w:r></w:p></w:tc>'
+    )
 
+@traced("index_docx")
 def generate_toc_docx(docx_filename, firm_name, case_name, heading_positions):
     doc = Document()
     style = doc.styles['Normal']
     font = style.font
     font.name = 'Times New Roman'
     font.size = Pt(12)
+    toc_styles = add_toc_styles(doc)
 
     top_par = doc.add_paragraph()
     top_par.alignment = WD_ALIGN_PARAGRAPH.CENTER
@@ -506,43 +773,27 @@ def generate_toc_docx(docx_filename, firm_name, case_name, heading_positions):
 
     table = doc.add_table(rows=0, cols=2)
     table.autofit = True
+    tbl = table._tbl
+    left_width, right_width = [grid_col.w.twips for grid_col in tbl.tblGrid.gridCol_lst]
+    row_xml = []
     for (heading_text, pg_num, ln_num, is_sub) in heading_positions:
         if re.match(r'(?i)^EXHIBIT\s+\d+:', heading_text):
-            row_cells = table.add_row().cells
-            left_cell = row_cells[0]
-            right_cell = row_cells[1]
-            left_par = left_cell.paragraphs[0]
-            run_left = left_par.add_run(heading_text)
-            run_left.font.size = Pt(12)
-            run_left.bold = True
-            right_par = right_cell.paragraphs[0]
-            run_right = right_par.add_run(f"{pg_num}")
-            run_right.font.size = Pt(12)
-            run_right.bold = False
-            right_par.alignment = WD_ALIGN_PARAGRAPH.RIGHT
+            left_xml = toc_cell_xml(heading_text, toc_styles["section"], left_width)
+            right_xml = toc_cell_xml(f"{pg_num}", toc_styles["section_page"], right_width)
+        elif is_sub:
+            left_xml = toc_cell_xml(heading_text, toc_styles["subsection"], left_width, bold=is_exhibit_reference(heading_text))
+            right_xml = toc_cell_xml(f"{pg_num}:{ln_num}", toc_styles["subsection_page"], right_width)
         else:
-            row_cells = table.add_row().cells
-            left_cell = row_cells[0]
-            right_cell = row_cells[1]
-            if is_sub:
-                this_font_size = 11
-                this_bold = False
-            else:
-                this_font_size = 12
-                this_bold = True
-            left_par = left_cell.paragraphs[0]
-            run_left = left_par.add_run(heading_text)
-            run_left.font.size = Pt(this_font_size)
-            run_left.bold = this_bold
-            if is_exhibit_reference(heading_text):
-                run_left.bold = True
-            right_par = right_cell.paragraphs[0]
-            run_right = right_par.add_run(f"{pg_num}:{ln_num}")
-            run_right.font.size = Pt(this_font_size)
-            run_right.bold = False
-            right_par.alignment = WD_ALIGN_PARAGRAPH.RIGHT
-    doc.save(docx_filename)
-
+            left_xml = toc_cell_xml(heading_text, toc_styles["section"], left_width)
+            right_xml = toc_cell_xml(f"{pg_num}:{ln_num}", toc_styles["section_page"], right_width)
+        row_xml.append(f"<w:tr>{left_xml}{right_xml}</w:tr>")
+    if row_xml:
+        rows_tbl = parse_xml(f"<w:tbl {nsdecls('w')}>{''.join(row_xml)}</w:tbl>")
+        tbl.extend(list(rows_tbl))
+    with span("index_docx.save"):
+        save_stable_docx(doc, docx_filename)
+
+@traced("parse.documents")
 def parse_documents_from_text(raw_text):
     lines = raw_text.splitlines()
     docs = []
@@ -564,9 +815,11 @@ def parse_documents_from_text(raw_text):
             i += 1
     return docs
 
+@traced("parse.sections")
 def parse_header_and_sections(raw_text):
     header_od = OrderedDict()
     sections_od = OrderedDict()
+    section_tree = SectionTree()
     heading_pattern = re.compile(r'^((?:[IVXLCDM]+\.|[0-9]+\.)+)\s+(.*)$', re.IGNORECASE)
     lines = raw_text.splitlines()
     idx = 0
@@ -596,39 +849,120 @@ def parse_header_and_sections(raw_text):
             if heading_number.endswith('.'):
                 heading_number = heading_number[:-1]
             current_heading_key = f"{heading_number} {heading_title}"
+            section_tree.add(current_heading_key, number=heading_number, title=heading_title)
         elif is_line_all_caps(line.strip()):
             if current_heading_key is not None:
                 sections_od[current_heading_key] = "\n".join(current_body_lines)
             current_body_lines = []
             current_heading_key = line.strip()
+            section_tree.add(current_heading_key, title=current_heading_key)
         elif re.match(r'^[0-9]+\.\s*$', line.strip()):
             if current_heading_key is not None:
                 sections_od[current_heading_key] = "\n".join(current_body_lines)
             current_body_lines = []
             current_heading_key = line.strip()
+            section_tree.add(current_heading_key, number=current_heading_key)
         else:
             current_body_lines.append(line)
         idx += 1
     if current_heading_key is not None:
         sections_od[current_heading_key] = "\n".join(current_body_lines)
-    return header_od, sections_od
-
-def classify_headings(sections_od):
-    heading_styles = {}
-    for full_key in sections_od.keys():
-        parts = full_key.split(None, 1)
-        if len(parts) == 2:
-            heading_number, _heading_text = parts[0], parts[1]
-        else:
-            heading_number = parts[0]
-        dot_count = heading_number.count('.')
-        if dot_count > 1:
-            heading_styles[full_key] = "subsection"
+    return header_od, sections_od, section_tree
+
+def normalize_section_number(number):
+    parts = number.strip().rstrip('.').split('.')
+    return '.'.join(part if len(part) == 1 else part.upper() for part in parts)
+
+def is_roman_section_number(number):
+    return re.match(r'^[IVXLCDM]+$', number.split('.', 1)[0]) is not None
+
+class SectionNode:
+    __slots__ = ("key", "number", "title", "style", "depth", "position", "parent", "children")
+
+    def __init__(self, key, number, title, position, parent=None):
+        self.key = key
+        self.number = number
+        self.title = title
+        self.style = "subsection" if key.split(None, 1)[0].count('.') > 1 else "section"
+        self.depth = parent.depth + 1 if parent is not None else 0
+        self.position = position
+        self.parent = parent
+        self.children = []
+
+    def iter_descendants(self):
+        stack = list(reversed(self.children))
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node.children))
+
+    def path(self):
+        nodes = []
+        node = self
+        while node is not None:
+            nodes.append(node)
+            node = node.parent
+        return nodes[::-1]
+
+class SectionTree:
+    def __init__(self):
+        self.roots = []
+        self.nodes = []
+        self.by_key = {}
+        self.by_number = {}
+        self.enclosing = None
+
+    def add(self, key, number=None, title=""):
+        if key in self.by_key:
+            return self.by_key[key]
+        parent = None
+        if number:
+            number = normalize_section_number(number)
+            parts = number.split('.')
+            for cut in range(len(parts) - 1, 0, -1):
+                candidates = self.by_number.get('.'.join(parts[:cut]))
+                if candidates:
+                    parent = candidates[-1]
+                    break
+        if parent is None and number and not is_roman_section_number(number):
+            parent = self.enclosing
+        node = SectionNode(key, number or None, title, len(self.nodes), parent)
+        if parent is None:
+            self.roots.append(node)
+            self.enclosing = node if not number or is_roman_section_number(number) else None
         else:
-            heading_styles[full_key] = "section"
-    return heading_styles
+            parent.children.append(node)
+        self.nodes.append(node)
+        self.by_key[key] = node
+        if node.number:
+            self.by_number.setdefault(node.number, []).append(node)
+        return node
+
+    def find(self, number):
+        candidates = self.by_number.get(normalize_section_number(number))
+        return candidates[0] if candidates else None
+
+    def find_all(self, number):
+        return list(self.by_number.get(normalize_section_number(number), ()))
+
+    def subsections(self, number):
+        node = self.find(number)
+        return list(node.iter_descendants()) if node is not None else []
+
+    def node_for(self, key):
+        return self.by_key.get(key)
 
-def prepare_main_pdf_segments(header_text, sections_od, heading_styles, pdf_canvas, max_text_width):
+    def heading_styles(self):
+        return {node.key: node.style for node in self.nodes}
+
+    def __iter__(self):
+        return iter(self.nodes)
+
+    def __len__(self):
+        return len(self.nodes)
+
+@traced("layout.wrap_segments")
+def prepare_main_pdf_segments(header_text, sections_od, section_tree, max_text_width, section_cache=None):
     segments = []
     header_lines = header_text.splitlines()
     normal_buffer = []
@@ -646,7 +980,7 @@ def prepare_main_pdf_segments(header_text, sections_od, heading_styles, pdf_canv
                     "is_subheading": False
                 })
             elif is_line_all_caps(line_str) or is_line_of_punctuation(line_str):
-                wrapped = wrap_text_to_lines(pdf_canvas, line_str, "Helvetica", 10, max_text_width)
+                wrapped = wrap_text_to_lines(line_str, "Helvetica", 10, max_text_width)
                 for (wl, _) in wrapped:
                     if is_exhibit_reference(line_str):
                         segments.append({
@@ -667,7 +1001,7 @@ def prepare_main_pdf_segments(header_text, sections_od, heading_styles, pdf_canv
                             "is_subheading": False
                         })
             else:
-                wrapped = wrap_text_to_lines(pdf_canvas, line_str, "Helvetica", 10, max_text_width)
+                wrapped = wrap_text_to_lines(line_str, "Helvetica", 10, max_text_width)
                 for (wl, _) in wrapped:
                     if is_exhibit_reference(line_str):
                         segments.append({
@@ -711,135 +1045,158 @@ def prepare_main_pdf_segments(header_text, sections_od, heading_styles, pdf_canv
             normal_buffer.append(block_lines)
     flush_normal_buffer()
 
+    used_cache_keys = set()
     for section_key, section_body in sections_od.items():
-        style = heading_styles.get(section_key, "section")
-        if style == "section":
-            heading_font_name = "Helvetica-Bold"
-            heading_font_size = 10
-            body_font_name = "Helvetica"
-            body_font_size = 10
-            is_heading = True
-            is_subheading = False
+        node = section_tree.node_for(section_key)
+        style = node.style if node is not None else "section"
+        depth = node.depth if node is not None else 0
+        cache_key = (section_key, section_body, style, depth, max_text_width)
+        if section_cache is not None and cache_key in section_cache:
+            section_segments = section_cache[cache_key]
         else:
-            heading_font_name = "Helvetica"
-            heading_font_size = 9
-            body_font_name = "Helvetica"
-            body_font_size = 9
-            is_heading = False
-            is_subheading = True
-
-        segments.append({
-            "text": "",
-            "font_name": body_font_name,
-            "font_size": body_font_size,
-            "alignment": "left",
-            "is_heading": False,
-            "is_subheading": False
-        })
-        if is_exhibit_reference(section_key):
-            heading_wrapped = wrap_text_to_lines(pdf_canvas, section_key, "Helvetica-Bold", heading_font_size, max_text_width)
-            for (wl, _) in heading_wrapped:
-                segments.append({
-                    "text": wl,
-                    "font_name": "Helvetica-Bold",
-                    "font_size": heading_font_size,
-                    "alignment": "center",
-                    "is_heading": is_heading,
-                    "is_subheading": is_subheading
-                })
-        else:
-            heading_wrapped = wrap_text_to_lines(pdf_canvas, section_key, heading_font_name, heading_font_size, max_text_width)
-            for (wl, _) in heading_wrapped:
-                segments.append({
-                    "text": wl,
-                    "font_name": heading_font_name,
-                    "font_size": heading_font_size,
-                    "alignment": "center",
-                    "is_heading": is_heading,
-                    "is_subheading": is_subheading
-                })
-        lines_of_body = section_body.splitlines()
-        normal_buffer_sec = []
-
-        def flush_section_buffer():
-            for line in normal_buffer_sec:
-                line_str = line.strip()
-                if not line_str:
-                    segments.append({
-                        "text": "",
-                        "font_name": body_font_name,
-                        "font_size": body_font_size,
-                        "alignment": "left",
-                        "is_heading": False,
-                        "is_subheading": False
-                    })
-                elif is_line_all_caps(line_str) or is_line_of_punctuation(line_str):
-                    wrapped = wrap_text_to_lines(pdf_canvas, line_str, body_font_name, body_font_size, max_text_width)
-                    for (wl, _) in wrapped:
-                        if is_exhibit_reference(line_str):
-                            segments.append({
-                                "text": wl,
-                                "font_name": "Helvetica-Bold",
-                                "font_size": body_font_size,
-                                "alignment": "center",
-                                "is_heading": False,
-                                "is_subheading": False
-                            })
-                        else:
-                            segments.append({
-                                "text": wl,
-                                "font_name": body_font_name,
-                                "font_size": body_font_size,
-                                "alignment": "center",
-                                "is_heading": False,
-                                "is_subheading": False
-                            })
-                else:
-                    wrapped = wrap_text_to_lines(pdf_canvas, line_str, body_font_name, body_font_size, max_text_width)
-                    for (wl, _) in wrapped:
-                        if is_exhibit_reference(line_str):
-                            segments.append({
-                                "text": wl,
-                                "font_name": "Helvetica-Bold",
-                                "font_size": body_font_size,
-                                "alignment": "left",
-                                "is_heading": False,
-                                "is_subheading": False
-                            })
-                        else:
-                            segments.append({
-                                "text": wl,
-                                "font_name": body_font_name,
-                                "font_size": body_font_size,
-                                "alignment": "left",
-                                "is_heading": False,
-                                "is_subheading": False
-                            })
-            normal_buffer_sec.clear()
-
-        for kind, block_lines in detect_legal_title_blocks(lines_of_body):
-            if kind == "legal_page_title_block":
-                flush_section_buffer()
-                lines_cleaned = [ln.strip() for ln in block_lines]
-                segments.append({
-                    "legal_page_title": True,
-                    "page_always_new": True,
-                    "lines": lines_cleaned
-                })
-            elif kind == "delimiter_line":
-                flush_section_buffer()
+            section_segments = prepare_section_segments(section_key, section_body, style, max_text_width, depth=depth)
+            if section_cache is not None:
+                section_cache[cache_key] = section_segments
+        used_cache_keys.add(cache_key)
+        segments.extend(section_segments)
+    if section_cache is not None:
+        for cache_key in [k for k in section_cache if k not in used_cache_keys]:
+            del section_cache[cache_key]
+    return segments
+
+def prepare_section_segments(section_key, section_body, style, max_text_width, depth=0):
+    segments = []
+    if style == "section":
+        heading_font_name = "Helvetica-Bold"
+        heading_font_size = 10
+        body_font_name = "Helvetica"
+        body_font_size = 10
+        is_heading = True
+        is_subheading = False
+    else:
+        heading_font_name = "Helvetica"
+        heading_font_size = 9
+        body_font_name = "Helvetica"
+        body_font_size = 9
+        is_heading = False
+        is_subheading = True
+
+    segments.append({
+        "text": "",
+        "font_name": body_font_name,
+        "font_size": body_font_size,
+        "alignment": "left",
+        "is_heading": False,
+        "is_subheading": False
+    })
+    if is_exhibit_reference(section_key):
+        heading_wrapped = wrap_text_to_lines(section_key, "Helvetica-Bold", heading_font_size, max_text_width)
+        for (wl, _) in heading_wrapped:
+            segments.append({
+                "text": wl,
+                "font_name": "Helvetica-Bold",
+                "font_size": heading_font_size,
+                "alignment": "center",
+                "is_heading": is_heading,
+                "is_subheading": is_subheading
+            })
+    else:
+        heading_wrapped = wrap_text_to_lines(section_key, heading_font_name, heading_font_size, max_text_width)
+        for (wl, _) in heading_wrapped:
+            segments.append({
+                "text": wl,
+                "font_name": heading_font_name,
+                "font_size": heading_font_size,
+                "alignment": "center",
+                "is_heading": is_heading,
+                "is_subheading": is_subheading
+            })
+    if heading_wrapped:
+        segments[len(segments) - len(heading_wrapped)]["outline_title"] = section_key
+        segments[len(segments) - len(heading_wrapped)]["outline_level"] = depth
+    lines_of_body = section_body.splitlines()
+    normal_buffer_sec = []
+
+    def flush_section_buffer():
+        for line in normal_buffer_sec:
+            line_str = line.strip()
+            if not line_str:
                 segments.append({
-                    "delimiter_line": True,
-                    "font_name": "Helvetica",
+                    "text": "",
+                    "font_name": body_font_name,
                     "font_size": body_font_size,
+                    "alignment": "left",
                     "is_heading": False,
                     "is_subheading": False
                 })
+            elif is_line_all_caps(line_str) or is_line_of_punctuation(line_str):
+                wrapped = wrap_text_to_lines(line_str, body_font_name, body_font_size, max_text_width)
+                for (wl, _) in wrapped:
+                    if is_exhibit_reference(line_str):
+                        segments.append({
+                            "text": wl,
+                            "font_name": "Helvetica-Bold",
+                            "font_size": body_font_size,
+                            "alignment": "center",
+                            "is_heading": False,
+                            "is_subheading": False
+                        })
+                    else:
+                        segments.append({
+                            "text": wl,
+                            "font_name": body_font_name,
+                            "font_size": body_font_size,
+                            "alignment": "center",
+                            "is_heading": False,
+                            "is_subheading": False
+                        })
             else:
-                normal_buffer_sec.append(block_lines)
-        flush_section_buffer()
+                wrapped = wrap_text_to_lines(line_str, body_font_name, body_font_size, max_text_width)
+                for (wl, _) in wrapped:
+                    if is_exhibit_reference(line_str):
+                        segments.append({
+                            "text": wl,
+                            "font_name": "Helvetica-Bold",
+                            "font_size": body_font_size,
+                            "alignment": "left",
+                            "is_heading": False,
+                            "is_subheading": False
+                        })
+                    else:
+                        segments.append({
+                            "text": wl,
+                            "font_name": body_font_name,
+                            "font_size": body_font_size,
+                            "alignment": "left",
+                            "is_heading": False,
+                            "is_subheading": False
+                        })
+        normal_buffer_sec.clear()
+
+    for kind, block_lines in detect_legal_title_blocks(lines_of_body):
+        if kind == "legal_page_title_block":
+            flush_section_buffer()
+            lines_cleaned = [ln.strip() for ln in block_lines]
+            segments.append({
+                "legal_page_title": True,
+                "page_always_new": True,
+                "lines": lines_cleaned
+            })
+        elif kind == "delimiter_line":
+            flush_section_buffer()
+            segments.append({
+                "delimiter_line": True,
+                "font_name": "Helvetica",
+                "font_size": body_font_size,
+                "is_heading": False,
+                "is_subheading": False
+            })
+        else:
+            normal_buffer_sec.append(block_lines)
+    flush_section_buffer()
     return segments
 
+@traced("parse.exhibits")
 def parse_exhibits_from_text(raw_text):
     lines = raw_text.splitlines()
     pattern = re.compile(r'^\s*EXHIBIT\s+(\d+)\s*:\s*(.*)$', re.IGNORECASE)
@@ -868,110 +1225,294 @@ def parse_exhibits_from_text(raw_text):
         seen_exhibits.add(current_exhibit_number)
     return exhibits
 
+@traced("draw.exhibit_text")
 def draw_exhibit_text(
     pdf_canvas,
     page_width,
     page_height,
-    firm_name,
-    case_name,
-    exhibit_text,
+    metrics,
+    text_lines,
     exhibit_label,
     page_number,
-    total_pages,
     font_name,
     font_size,
     line_spacing
 ):
     pdf_canvas.setLineWidth(2)
     pdf_canvas.rect(0.5 * inch, 0.5 * inch, page_width - 1.0 * inch, page_height - 1.0 * inch)
-    draw_firm_name_vertical_center(pdf_canvas, firm_name, page_width, page_height)
-    pdf_canvas.setFont("Helvetica-Bold", 12)
-    pdf_canvas.drawCentredString(page_width / 2.0, page_height - 0.5 * inch, case_name)
-    pdf_canvas.setLineWidth(1)
-    pdf_canvas.line(0.5 * inch, page_height - 0.6 * inch, page_width - 0.5 * inch, page_height - 0.6 * inch)
-    pdf_canvas.setFont(font_name, font_size)
-    max_text_width = page_width - 1.5 * inch
-    wrapped = wrap_text_to_lines(pdf_canvas, exhibit_text, font_name, font_size, max_text_width)
+    draw_page_header(pdf_canvas, metrics, page_width, page_height)
     y_text = page_height - 0.8 * inch
     left_margin = 1.0 * inch
     pdf_canvas.setFont("Helvetica-Bold", 10)
     pdf_canvas.drawString(left_margin, y_text, exhibit_label)
     y_text -= (line_spacing * 2)
     pdf_canvas.setFont(font_name, font_size)
-    for idx, (txt_line, _) in enumerate(wrapped):
-        if y_text < 0.6 * inch:
-            pdf_canvas.setFont("Helvetica-Oblique", 9)
-            footer_text = f"Page {page_number} of {total_pages}"
-            pdf_canvas.drawCentredString(page_width / 2.0, 0.4 * inch, footer_text)
-            pdf_canvas.showPage()
-            page_number += 1
-            pdf_canvas.setLineWidth(2)
-            pdf_canvas.rect(0.5 * inch, 0.5 * inch, page_width - 1.0 * inch, page_height - 1.0 * inch)
-            draw_firm_name_vertical_center(pdf_canvas, firm_name, page_width, page_height)
-            pdf_canvas.setFont("Helvetica-Bold", 12)
-            pdf_canvas.drawCentredString(page_width / 2.0, page_height - 0.5 * inch, case_name)
-            pdf_canvas.setLineWidth(1)
-            pdf_canvas.line(0.5 * inch, page_height - 0.6 * inch, page_width - 0.5 * inch, page_height - 0.6 * inch)
-            pdf_canvas.setFont(font_name, font_size)
-            y_text = page_height - 0.8 * inch
-            pdf_canvas.setFont("Helvetica-Bold", 10)
-            pdf_canvas.drawString(left_margin, y_text, exhibit_label)
-            y_text -= (line_spacing * 2)
-            pdf_canvas.setFont(font_name, font_size)
+    for txt_line in text_lines:
         pdf_canvas.drawString(left_margin, y_text, txt_line)
         y_text -= line_spacing
-    return page_number
+    draw_page_footer(pdf_canvas, metrics, page_width, page_number)
+
+def paginate_exhibit_lines(line_count, page_height, line_spacing):
+    line_ranges = []
+    start_index = 0
+    y_text = page_height - 0.8 * inch - line_spacing * 2
+    for idx in range(line_count):
+        if y_text < 0.6 * inch:
+            line_ranges.append((start_index, idx))
+            start_index = idx
+            y_text = page_height - 0.8 * inch - line_spacing * 2
+        y_text -= line_spacing
+    line_ranges.append((start_index, line_count))
+    return line_ranges
+
+@traced("layout.exhibits")
+def plan_exhibit_pages(exhibits, line_spacing):
+    page_width, page_height = letter
+    page_plan = []
+    for idx, (ex_content, image_path) in enumerate(exhibits, start=1):
+        wrapped = wrap_text_to_lines(ex_content, "Helvetica", 10, page_width - 1.5 * inch)
+        for start_index, end_index in paginate_exhibit_lines(len(wrapped), page_height, line_spacing):
+            page_plan.append({
+                "kind": "exhibit_text",
+                "exhibit": idx,
+                "lines": [txt_line for txt_line, _ in wrapped[start_index:end_index]]
+            })
+        if image_path:
+            page_plan.append({"kind": "exhibit_image", "exhibit": idx, "image_path": image_path})
+    return page_plan
+
+def plan_document_pages(layout, exhibits):
+    page_plan = [{"kind": "body", "start": start_index, "end": end_index} for start_index, end_index in layout["pages"]]
+    page_plan.extend(plan_exhibit_pages(exhibits, layout["line_spacing"]))
+    return page_plan
+
+def layout_exhibits(exhibits, first_page, line_spacing):
+    exhibit_spans = OrderedDict()
+    for page_number, page in enumerate(plan_exhibit_pages(exhibits, line_spacing), start=first_page):
+        exhibit_span = exhibit_spans.get(page["exhibit"])
+        if exhibit_span is None:
+            exhibit_span = OrderedDict([
+                ("exhibit", page["exhibit"]),
+                ("first_page", page_number),
+                ("text_pages", 0),
+                ("image_page", None),
+                ("last_page", page_number)
+            ])
+            exhibit_spans[page["exhibit"]] = exhibit_span
+        if page["kind"] == "exhibit_text":
+            exhibit_span["text_pages"] += 1
+        else:
+            exhibit_span["image_page"] = page_number
+        exhibit_span["last_page"] = page_number
+    return list(exhibit_spans.values())
+
+class PageSelectionError(ValueError):
+    pass
+
+def parse_page_ranges(spec):
+    page_ranges = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        first, dash, last = part.partition("-")
+        try:
+            first_page = int(first)
+            last_page = int(last) if dash else first_page
+        except ValueError:
+            raise PageSelectionError(f"Invalid page range: {part}") from None
+        if first_page < 1 or last_page < first_page:
+            raise PageSelectionError(f"Invalid page range: {part}")
+        page_ranges.append((first_page, last_page))
+    if not page_ranges:
+        raise PageSelectionError(f"No pages in range: {spec}")
+    return sorted(page_ranges)
+
+def page_in_ranges(page_ranges, page_number):
+    return any(first_page <= page_number <= last_page for first_page, last_page in page_ranges)
+
+def selected_page_numbers(page_ranges, total_pages):
+    selected = [page_number for page_number in range(1, total_pages + 1) if page_in_ranges(page_ranges, page_number)]
+    if not selected:
+        raise PageSelectionError(f"None of the requested pages exist; the document has {total_pages} pages")
+    return selected
+
+def exhibit_image_area(page_width, page_height):
+    top_of_image_area = page_height - 0.8 * inch
+    bottom_of_image_area = 0.5 * inch
+    return page_width - 1.0 * inch, top_of_image_area - bottom_of_image_area
+
+def prepare_exhibit_image(image_path, available_width, available_height, target_dpi=150, jpeg_quality=85, cache_dir=".exhibit_cache"):
+    prepared = {"source": image_path}
+    try:
+        with open(image_path, "rb") as f:
+            data = f.read()
+        img = PILImage.open(io.BytesIO(data))
+        img_width, img_height = img.size
+    except Exception as e:
+        prepared["error"] = e
+        return prepared
+    scale = min(available_width / img_width, available_height / img_height, 1.0)
+    prepared.update({
+        "digest": hashlib.sha256(data).hexdigest(),
+        "path": image_path,
+        "width": img_width * scale,
+        "height": img_height * scale,
+        "original_bytes": len(data),
+        "prepared_bytes": len(data)
+    })
+    if not target_dpi:
+        return prepared
+    target_width = max(1, min(img_width, int(round(prepared["width"] / 72.0 * target_dpi))))
+    target_height = max(1, min(img_height, int(round(prepared["height"] / 72.0 * target_dpi))))
+    cache_path = os.path.join(
+        cache_dir,
+        f"{prepared['digest']}_{target_dpi}dpi_q{jpeg_quality}_{target_width}x{target_height}.jpg"
+    )
+    if not os.path.exists(cache_path):
+        tmp_path = None
+        try:
+            if (target_width, target_height) != (img_width, img_height):
+                img = img.resize((target_width, target_height), PILImage.LANCZOS)
+            if img.mode in ("RGBA", "LA", "P"):
+                img = img.convert("RGBA")
+                flattened = PILImage.new("RGB", img.size, (255, 255, 255))
+                flattened.paste(img, mask=img.getchannel("A"))
+                img = flattened
+            elif img.mode != "RGB":
+                img = img.convert("RGB")
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=cache_dir)
+            with os.fdopen(tmp_fd, "wb") as tmp_file:
+                img.save(tmp_file, "JPEG", quality=jpeg_quality, optimize=True)
+            os.replace(tmp_path, cache_path)
+        except Exception as e:
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            prepared["error"] = e
+            return prepared
+    cached_bytes = os.path.getsize(cache_path)
+    if cached_bytes < prepared["original_bytes"]:
+        prepared["path"] = cache_path
+        prepared["prepared_bytes"] = cached_bytes
+    return prepared
+
+@traced("images.prepare")
+def prepare_exhibit_images(
+    image_paths,
+    available_width,
+    available_height,
+    target_dpi=150,
+    jpeg_quality=85,
+    cache_dir=".exhibit_cache",
+    max_workers=None,
+    memo=None
+):
+    unique_paths = list(OrderedDict.fromkeys(p for p in image_paths if p))
+    if not unique_paths:
+        return {}
+    memo_keys = {}
+    if memo is not None:
+        for image_path in unique_paths:
+            try:
+                st = os.stat(image_path)
+                memo_keys[image_path] = (image_path, st.st_mtime_ns, st.st_size, available_width, available_height, target_dpi, jpeg_quality)
+            except OSError:
+                pass
+    missing_paths = [p for p in unique_paths if memo_keys.get(p) not in (memo or {})]
+    if max_workers is None:
+        max_workers = min(4, len(missing_paths))
+
+    def prepare(image_path):
+        return prepare_exhibit_image(
+            image_path,
+            available_width,
+            available_height,
+            target_dpi=target_dpi,
+            jpeg_quality=jpeg_quality,
+            cache_dir=cache_dir
+        )
+
+    if max_workers > 1:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            prepared_list = list(executor.map(prepare, missing_paths))
+    else:
+        prepared_list = [prepare(p) for p in missing_paths]
+    fresh = dict(zip(missing_paths, prepared_list))
+    prepared_by_path = OrderedDict()
+    first_by_digest = {}
+    for image_path in unique_paths:
+        if image_path in fresh:
+            prepared = fresh[image_path]
+            if memo is not None and image_path in memo_keys and not prepared.get("error"):
+                memo[memo_keys[image_path]] = dict(prepared)
+        else:
+            prepared = dict(memo[memo_keys[image_path]])
+        digest = prepared.get("digest")
+        if digest in first_by_digest:
+            prepared["path"] = first_by_digest[digest]["path"]
+            prepared["prepared_bytes"] = first_by_digest[digest]["prepared_bytes"]
+        elif digest:
+            first_by_digest[digest] = prepared
+        prepared_by_path[image_path] = prepared
+    return prepared_by_path
+
+def print_image_report(prepared_images):
+    loaded = [img for img in prepared_images if not img.get("error")]
+    if not loaded:
+        return
+    original_total = sum(img["original_bytes"] for img in loaded)
+    embedded = {img["path"]: img["prepared_bytes"] for img in loaded}
+    prepared_total = sum(embedded.values())
+    print(
+        f"Exhibit images: {len(loaded)} attached, {len(embedded)} embedded, {original_total / 1024:.1f} KB -> "
+        f"{prepared_total / 1024:.1f} KB (saved {(original_total - prepared_total) / 1024:.1f} KB)\n"
+    )
 
+def print_volume_report(volumes, max_volume_bytes=None):
+    print("Volumes:")
+    for volume in volumes:
+        over_cap = " (over the size cap)" if max_volume_bytes and volume["bytes"] and volume["bytes"] > max_volume_bytes else ""
+        print(
+            f"  {volume['volume']:>3}  pages {volume['first_page']}-{volume['last_page']}  "
+            f"{(volume['bytes'] or 0) / 1024:.1f} KB  {volume['path']}{over_cap}"
+        )
+    print()
+
+@traced("draw.exhibit_image")
 def draw_exhibit_image(
     pdf_canvas,
     page_width,
     page_height,
-    firm_name,
-    case_name,
-    image_path,
-    page_number,
-    total_pages
+    metrics,
+    exhibit_image,
+    page_number
 ):
     pdf_canvas.setLineWidth(2)
     pdf_canvas.rect(0.5 * inch, 0.5 * inch, page_width - 1.0 * inch, page_height - 0.9 * inch)
-    draw_firm_name_vertical_center(pdf_canvas, firm_name, page_width, page_height)
-    pdf_canvas.setFont("Helvetica-Bold", 12)
-    pdf_canvas.drawCentredString(page_width / 2.0, page_height - 0.5 * inch, case_name)
-    pdf_canvas.setLineWidth(1)
-    pdf_canvas.line(0.5 * inch, page_height - 0.6 * inch, page_width - 0.5 * inch, page_height - 0.6 * inch)
-    top_of_image_area = page_height - 0.8 * inch
-    bottom_of_image_area = 0.5 * inch
-    available_height = top_of_image_area - bottom_of_image_area
-    available_width = page_width - 1.0 * inch
-    if image_path:
-        try:
-            img_reader = ImageReader(image_path)
-            img_width, img_height = img_reader.getSize()
-        except Exception as e:
+    draw_page_header(pdf_canvas, metrics, page_width, page_height)
+    available_width, _available_height = exhibit_image_area(page_width, page_height)
+    if exhibit_image:
+        if exhibit_image.get("error"):
             pdf_canvas.setFont("Helvetica-Oblique", 10)
             pdf_canvas.drawCentredString(
                 page_width / 2.0,
                 page_height / 2.0,
-                f"Unable to load image: {image_path} Error: {e}"
+                f"Unable to load image: {exhibit_image['source']} Error: {exhibit_image['error']}"
             )
         else:
-            scale = min(available_width / img_width, available_height / img_height, 1.0)
-            new_width = img_width * scale
-            new_height = img_height * scale
-            x_img = 0.5 * inch + (available_width - new_width) / 2.0
-            y_img_bottom = bottom_of_image_area
+            x_img = 0.5 * inch + (available_width - exhibit_image["width"]) / 2.0
+            y_img_bottom = 0.5 * inch
             pdf_canvas.drawImage(
-                img_reader,
+                exhibit_image["path"],
                 x_img,
                 y_img_bottom,
-                width=new_width,
-                height=new_height,
+                width=exhibit_image["width"],
+                height=exhibit_image["height"],
                 preserveAspectRatio=True,
                 anchor='c'
             )
-    pdf_canvas.setFont("Helvetica-Oblique", 9)
-    footer_text = f"Page {page_number} of {total_pages}"
-    pdf_canvas.drawCentredString(page_width / 2.0, 0.4 * inch, footer_text)
+    draw_page_footer(pdf_canvas, metrics, page_width, page_number)
 
 class Lawsuit:
     def __init__(
@@ -1008,46 +1549,85 @@ class Lawsuit:
         self.ai_legal_notes = "AGI analysis: " + raw_input_data[:50] + "..."
 
     def run_agi_legal_professionalism(self, pdf_file_texts):
-        aggregated_text = " ".join(pdf_file_texts)[:100]
-        self.agi_legal_professional_output = "Advanced AGI reply: " + aggregated_text
+        aggregated_text = None
+        for text in pdf_file_texts:
+            aggregated_text = text[:100] if aggregated_text is None else aggregated_text + " " + text[:100]
+            if len(aggregated_text) >= 100:
+                break
+        if aggregated_text is not None:
+            self.agi_legal_professional_output = "Advanced AGI reply: " + aggregated_text[:100]
+
+    def iter_dump(self):
+        yield "Lawsuit Object:\n\n"
+        yield "CASE INFORMATION:\n"
+        yield f"  {self.case_information}\n\n"
+        yield "LAW FIRM INFORMATION:\n"
+        yield f"  {self.law_firm_information}\n\n"
+        yield "HEADER:\n"
+        for index, (k, v) in enumerate(self.header.items()):
+            yield ("\n" if index else "") + f"  {k}: {v}"
+        yield "\n\nSECTIONS:\n"
+        for index, (sec_key, sec_value) in enumerate(self.sections.items()):
+            yield ("\n" if index else "") + f"  {sec_key}: "
+            yield sec_value
+        yield "\n\nEXHIBITS:\n"
+        for index, (ex_key, ex_data) in enumerate(self.exhibits.items()):
+            ex_inner = "\n      ".join([f"{ik}: {iv}" for ik, iv in ex_data.items()])
+            yield ("\n" if index else "") + f"  {ex_key}:\n      {ex_inner}"
+        yield "\n\nDOCUMENTS:\n"
+        for index, (doc_key, doc_text) in enumerate(self.documents.items()):
+            yield ("\n" if index else "") + f"  {doc_key}:\n      "
+            yield doc_text
+        yield "\n\nAI LEGAL NOTES:\n"
+        yield f"  {self.ai_legal_notes}\n\n"
+        yield "AGI LEGAL PROFESSIONALISM:\n"
+        yield f"  {self.agi_legal_professional_output}\n"
+
+    def write_dump(self, stream):
+        for chunk in self.iter_dump():
+            stream.write(chunk)
+
+    def summary(self):
+        return OrderedDict([
+            ("case", self.case_information),
+            ("firm", self.law_firm_information),
+            ("header_fields", len(self.header)),
+            ("sections", len(self.sections)),
+            ("section_chars", sum(len(v) for v in self.sections.values())),
+            ("exhibits", len(self.exhibits)),
+            ("exhibit_images", sum(1 for ex in self.exhibits.values() if ex.get("image_path"))),
+            ("exhibit_chars", sum(len(ex.get("caption", "")) for ex in self.exhibits.values())),
+            ("documents", len(self.documents)),
+            ("document_chars", sum(len(v) for v in self.documents.values())),
+            ("ai_legal_notes_chars", len(self.ai_legal_notes)),
+            ("agi_reply_chars", len(self.agi_legal_professional_output))
+        ])
 
     def __repr__(self):
-        header_str = "\n".join([f"  {k}: {v}" for k, v in self.header.items()])
-        sections_str = "\n".join([f"  {sec_key}: {sec_value}" for sec_key, sec_value in self.sections.items()])
-        exhibits_str = []
-        for ex_key, ex_data in self.exhibits.items():
-            ex_inner = "\n      ".join([f"{ik}: {iv}" for ik, iv in ex_data.items()])
-            exhibits_str.append(f"  {ex_key}:\n      {ex_inner}")
-        exhibits_str = "\n".join(exhibits_str)
-        documents_str = []
-        for doc_key, doc_text in self.documents.items():
-            documents_str.append(f"  {doc_key}:\n      {doc_text}")
-        documents_str = "\n".join(documents_str)
-        return (
-            "Lawsuit Object:\n\n"
-            "CASE INFORMATION:\n"
-            f"  {self.case_information}\n\n"
-            "LAW FIRM INFORMATION:\n"
-            f"  {self.law_firm_information}\n\n"
-            "HEADER:\n"
-            f"{header_str}\n\n"
-            "SECTIONS:\n"
-            f"{sections_str}\n\n"
-            "EXHIBITS:\n"
-            f"{exhibits_str}\n\n"
-            "DOCUMENTS:\n"
-            f"{documents_str}\n\n"
-            "AI LEGAL NOTES:\n"
-            f"  {self.ai_legal_notes}\n\n"
-            "AGI LEGAL PROFESSIONALISM:\n"
-            f"  {self.agi_legal_professional_output}\n"
-        )
+        return "".join(self.iter_dump())
 
-def detect_case_numbers(text):
-    pattern = re.compile(r'\b([A-Z]{1,5}\s*\d{1,}-\d+)\b', re.IGNORECASE)
-    return set(re.findall(pattern, text))
+CASE_NUMBER_PATTERN = re.compile(r'\b([A-Z]{1,5}\s*\d{1,}-\d+)\b', re.IGNORECASE)
 
-def store_lawsuit_in_db(lawsuit_obj, db_conn):
+@traced("parse.case_numbers")
+def detect_case_numbers(text):
+    return set(re.findall(CASE_NUMBER_PATTERN, text))
+
+def normalize_case_number(case_number):
+    return re.sub(r'\s+', '', case_number).upper()
+
+@traced("parse.case_citations")
+def detect_case_citations(header_od, sections_od, exhibits_od):
+    parts = [("HEADER", header_od.get("content", ""))]
+    parts.extend((section_key, f"{section_key}\n{section_body}") for section_key, section_body in sections_od.items())
+    parts.extend((f"EXHIBIT {ex_key}", ex_data.get("caption", "")) for ex_key, ex_data in exhibits_od.items())
+    citations = []
+    for section, text in parts:
+        for m in CASE_NUMBER_PATTERN.finditer(text):
+            citations.append((normalize_case_number(m.group(1)), section, m.start(1), m.group(1)))
+    return citations
+
+@traced("sqlite.store_lawsuit")
+def store_lawsuit_in_db(lawsuit_obj, db_conn, spill_to_disk=False, section_tree=None):
     db_conn.execute("""
         CREATE TABLE IF NOT EXISTS cases (
             case_number TEXT PRIMARY KEY,
@@ -1057,23 +1637,100 @@ def store_lawsuit_in_db(lawsuit_obj, db_conn):
             is_active INTEGER DEFAULT 0
         )
     """)
-    pickled_data = pickle.dumps(lawsuit_obj)
+    if spill_to_disk and hasattr(db_conn, "blobopen"):
+        spill_file = tempfile.TemporaryFile()
+        pickle.dump(lawsuit_obj, spill_file)
+        data_sql = "zeroblob(?)"
+        data_value = spill_file.tell()
+        spill_file.seek(0)
+    else:
+        spill_file = None
+        data_sql = "?"
+        data_value = pickle.dumps(lawsuit_obj)
     existing = db_conn.execute(
         "SELECT case_number FROM cases WHERE case_number = ?",
         (lawsuit_obj.case_information,)
     ).fetchone()
     if existing:
         db_conn.execute(
-            "UPDATE cases SET firm_name=?, creation_date=?, data=? WHERE case_number=?",
-            (lawsuit_obj.law_firm_information, datetime.datetime.now().isoformat(), pickled_data, lawsuit_obj.case_information)
+            f"UPDATE cases SET firm_name=?, creation_date=?, data={data_sql} WHERE case_number=?",
+            (lawsuit_obj.law_firm_information, datetime.datetime.now().isoformat(), data_value, lawsuit_obj.case_information)
         )
     else:
         db_conn.execute(
-            "INSERT INTO cases (case_number, firm_name, creation_date, data) VALUES (?, ?, ?, ?)",
-            (lawsuit_obj.case_information, lawsuit_obj.law_firm_information, datetime.datetime.now().isoformat(), pickled_data)
+            f"INSERT INTO cases (case_number, firm_name, creation_date, data) VALUES (?, ?, ?, {data_sql})",
+            (lawsuit_obj.case_information, lawsuit_obj.law_firm_information, datetime.datetime.now().isoformat(), data_value)
         )
+    if spill_file is not None:
+        row_id = db_conn.execute(
+            "SELECT rowid FROM cases WHERE case_number = ?",
+            (lawsuit_obj.case_information,)
+        ).fetchone()[0]
+        with spill_file, db_conn.blobopen("cases", "data", row_id) as blob:
+            for chunk in iter(lambda: spill_file.read(1 << 20), b""):
+                blob.write(chunk)
+    if section_tree is not None:
+        store_section_tree_in_db(lawsuit_obj.case_information, section_tree, db_conn)
     db_conn.commit()
 
+def ensure_section_table(db_conn):
+    db_conn.execute("""
+        CREATE TABLE IF NOT EXISTS sections (
+            case_number TEXT,
+            position INTEGER,
+            number TEXT,
+            parent_position INTEGER,
+            depth INTEGER,
+            section_key TEXT,
+            PRIMARY KEY (case_number, position)
+        )
+    """)
+    db_conn.execute("CREATE INDEX IF NOT EXISTS sections_by_number ON sections (case_number, number)")
+    db_conn.execute("CREATE INDEX IF NOT EXISTS sections_by_parent ON sections (case_number, parent_position)")
+
+@traced("sqlite.sections")
+def store_section_tree_in_db(case_number, section_tree, db_conn):
+    ensure_section_table(db_conn)
+    db_conn.execute("DELETE FROM sections WHERE case_number = ?", (case_number,))
+    db_conn.executemany(
+        "INSERT INTO sections (case_number, position, number, parent_position, depth, section_key) VALUES (?, ?, ?, ?, ?, ?)",
+        (
+            (case_number, node.position, node.number, node.parent.position if node.parent is not None else None, node.depth, node.key)
+            for node in section_tree
+        )
+    )
+
+def section_row(row):
+    return OrderedDict(zip(("position", "number", "parent_position", "depth", "section_key"), row))
+
+def lookup_section_in_db(case_number, number, db_conn):
+    ensure_section_table(db_conn)
+    row = db_conn.execute(
+        "SELECT position, number, parent_position, depth, section_key FROM sections "
+        "WHERE case_number = ? AND number = ? ORDER BY position LIMIT 1",
+        (case_number, normalize_section_number(number))
+    ).fetchone()
+    return section_row(row) if row else None
+
+def lookup_subsections_in_db(case_number, number, db_conn):
+    section = lookup_section_in_db(case_number, number, db_conn)
+    if section is None:
+        return []
+    rows = db_conn.execute("""
+        WITH RECURSIVE subtree(position) AS (
+            SELECT position FROM sections WHERE case_number = ? AND parent_position = ?
+            UNION ALL
+            SELECT sections.position FROM sections JOIN subtree ON sections.parent_position = subtree.position
+            WHERE sections.case_number = ?
+        )
+        SELECT sections.position, number, parent_position, depth, section_key
+        FROM sections JOIN subtree ON sections.position = subtree.position
+        WHERE sections.case_number = ?
+        ORDER BY sections.position
+    """, (case_number, section["position"], case_number, case_number)).fetchall()
+    return [section_row(row) for row in rows]
+
+@traced("sqlite.detected_cases")
 def store_detected_cases_in_db(detected_cases, db_conn):
     db_conn.execute("""
         CREATE TABLE IF NOT EXISTS detected_cases (
@@ -1093,29 +1750,140 @@ def store_detected_cases_in_db(detected_cases, db_conn):
             )
     db_conn.commit()
 
+def ensure_citation_table(db_conn):
+    db_conn.execute("CREATE TABLE IF NOT EXISTS cases (case_number TEXT PRIMARY KEY, firm_name TEXT, creation_date TEXT, data BLOB, is_active INTEGER DEFAULT 0)")
+    db_conn.execute("""
+        CREATE TABLE IF NOT EXISTS case_citations (
+            case_number TEXT,
+            filing TEXT,
+            section TEXT,
+            offset INTEGER,
+            citation TEXT
+        )
+    """)
+    db_conn.execute("CREATE INDEX IF NOT EXISTS case_citations_by_case_number ON case_citations (case_number, filing)")
+    db_conn.execute("CREATE INDEX IF NOT EXISTS case_citations_by_filing ON case_citations (filing)")
+
+@traced("sqlite.case_citations")
+def store_case_citations_in_db(filing, citations, db_conn):
+    ensure_citation_table(db_conn)
+    db_conn.execute("DELETE FROM case_citations WHERE filing = ?", (filing,))
+    db_conn.executemany(
+        "INSERT INTO case_citations (case_number, filing, section, offset, citation) VALUES (?, ?, ?, ?, ?)",
+        ((case_number, filing, section, offset, citation) for case_number, section, offset, citation in citations)
+    )
+    db_conn.commit()
+
+def lookup_case_citations(case_number, db_conn):
+    ensure_citation_table(db_conn)
+    rows = db_conn.execute(
+        "SELECT filing, section, offset, citation FROM case_citations WHERE case_number = ? ORDER BY filing, rowid",
+        (normalize_case_number(case_number),)
+    ).fetchall()
+    return [OrderedDict(zip(("filing", "section", "offset", "citation"), row)) for row in rows]
+
+def lookup_citing_filings(case_number, db_conn):
+    ensure_citation_table(db_conn)
+    rows = db_conn.execute("""
+        SELECT case_citations.filing, COUNT(*), COUNT(DISTINCT case_citations.section), cases.firm_name, cases.creation_date
+        FROM case_citations LEFT JOIN cases ON cases.case_number = case_citations.filing
+        WHERE case_citations.case_number = ?
+        GROUP BY case_citations.filing
+        ORDER BY case_citations.filing
+    """, (normalize_case_number(case_number),)).fetchall()
+    return [OrderedDict(zip(("filing", "citations", "sections", "firm_name", "creation_date"), row)) for row in rows]
+
+class UnavailableStoredType(type):
+    def __getattr__(cls, name):
+        return cls
+
+class UnavailableStoredObject(metaclass=UnavailableStoredType):
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __setstate__(self, state):
+        pass
+
+class StoredLawsuitUnpickler(pickle.Unpickler):
+    def find_class(self, module, name):
+        if module == "__main__" and name == "Lawsuit":
+            return Lawsuit
+        try:
+            return super().find_class(module, name)
+        except (ImportError, AttributeError):
+            return UnavailableStoredObject
+
+@traced("sqlite.reindex_citations")
+def index_stored_filings(db_conn):
+    ensure_citation_table(db_conn)
+    filings = [row[0] for row in db_conn.execute("SELECT case_number FROM cases ORDER BY case_number")]
+    indexed = OrderedDict()
+    for filing in filings:
+        data = db_conn.execute("SELECT data FROM cases WHERE case_number = ?", (filing,)).fetchone()[0]
+        try:
+            lawsuit_obj = StoredLawsuitUnpickler(io.BytesIO(data)).load()
+        except Exception as e:
+            indexed[filing] = f"{type(e).__name__}: {e}"
+            continue
+        citations = detect_case_citations(lawsuit_obj.header, lawsuit_obj.sections, lawsuit_obj.exhibits)
+        store_case_citations_in_db(filing, citations, db_conn)
+        indexed[filing] = len(citations)
+    return indexed
+
 def set_active_case(case_number, db_conn):
     db_conn.execute("CREATE TABLE IF NOT EXISTS cases (case_number TEXT PRIMARY KEY, firm_name TEXT, creation_date TEXT, data BLOB, is_active INTEGER DEFAULT 0)")
     db_conn.execute("UPDATE cases SET is_active = 0")
     db_conn.execute("UPDATE cases SET is_active = 1 WHERE case_number = ?", (case_number,))
     db_conn.commit()
 
-def generate_legal_document(
-    firm_name,
-    case_name,
-    output_filename,
-    header_od,
-    sections_od,
-    exhibits,
-    heading_positions
-):
+@traced("layout.paginate")
+def paginate_segments(segments, max_lines_per_page):
+    pages = []
+    start_index = 0
+    total_segments = len(segments)
+    while start_index < total_segments:
+        if segments[start_index].get("page_always_new"):
+            pages.append((start_index, start_index + 1))
+            start_index += 1
+            continue
+        end_index = start_index
+        while end_index < total_segments and end_index - start_index < max_lines_per_page:
+            if segments[end_index].get("page_always_new"):
+                break
+            end_index += 1
+        pages.append((start_index, end_index))
+        start_index = end_index
+    return pages
+
+def locate_sections(segments, pages):
+    section_ranges = []
+    for page_number, (start_index, end_index) in enumerate(pages, start=1):
+        for seg_index in range(start_index, end_index):
+            seg = segments[seg_index]
+            if seg.get("outline_title"):
+                section_ranges.append([seg["outline_title"], page_number, page_number])
+            elif section_ranges and (seg.get("text") or seg.get("legal_page_title") or seg.get("delimiter_line")):
+                section_ranges[-1][2] = page_number
+    return [tuple(section_range) for section_range in section_ranges]
+
+def locate_headings(segments, pages, line_offset_y, line_spacing):
+    heading_positions = []
+    outline_entries = []
+    for page_number, (start_index, end_index) in enumerate(pages, start=1):
+        for row, seg_index in enumerate(range(start_index, end_index)):
+            seg = segments[seg_index]
+            if not (seg.get("is_heading") or seg.get("is_subheading")):
+                continue
+            heading_positions.append((seg["text"], page_number, seg_index + 1, seg["is_subheading"]))
+            if seg.get("outline_title"):
+                level = seg.get("outline_level", 0)
+                y_top = line_offset_y - row * line_spacing + line_spacing
+                outline_entries.append((seg["outline_title"], page_number, y_top, level))
+    return heading_positions, outline_entries
+
+@traced("layout")
+def layout_complaint(header_od, sections_od, section_tree, section_cache=None):
     page_width, page_height = letter
-    pdf_canvas = canvas.Canvas(output_filename, pagesize=letter)
-    pdf_canvas.setTitle("Legal Document without Cover Sheet")
-    pdf_canvas.setAuthor(firm_name)
-    pdf_canvas.setSubject(case_name)
-    pdf_canvas.setCreator("Legal PDF Generator")
-
-    heading_styles = classify_headings(sections_od)
     top_margin = 1.0 * inch
     bottom_margin = 1.0 * inch
     left_margin = 1.2 * inch
@@ -1126,106 +1894,354 @@ def generate_legal_document(
     line_offset_x = left_margin
     line_offset_y = page_height - top_margin
     max_text_width = page_width - right_margin - line_offset_x - 0.2 * inch
-
     segments = prepare_main_pdf_segments(
         header_text=header_od.get("content", ""),
         sections_od=sections_od,
-        heading_styles=heading_styles,
-        pdf_canvas=pdf_canvas,
-        max_text_width=max_text_width
+        section_tree=section_tree,
+        max_text_width=max_text_width,
+        section_cache=section_cache
     )
-    current_index = 0
-    text_pages = 0
-    total_segments = len(segments)
-    while current_index < total_segments:
-        seg = segments[current_index]
-        if seg.get("page_always_new"):
-            text_pages += 1
-            current_index += 1
+    pages = paginate_segments(segments, max_lines_per_page)
+    heading_positions, outline_entries = locate_headings(segments, pages, line_offset_y, line_spacing)
+    return {
+        "heading_styles": section_tree.heading_styles(),
+        "segments": segments,
+        "pages": pages,
+        "heading_positions": heading_positions,
+        "outline_entries": outline_entries,
+        "max_lines_per_page": max_lines_per_page,
+        "line_offset_x": line_offset_x,
+        "line_offset_y": line_offset_y,
+        "line_spacing": line_spacing
+    }
+
+def separate_after_exhibit_1(full_text):
+    pattern_ex1 = re.compile(r'^\s*EXHIBIT\s+1\s*:', re.IGNORECASE)
+    lines = full_text.splitlines()
+    main_part = []
+    exhibits_part = []
+    found_ex1 = False
+    for line in lines:
+        if not found_ex1 and pattern_ex1.match(line):
+            found_ex1 = True
+            exhibits_part.append(line)
+        elif found_ex1:
+            exhibits_part.append(line)
         else:
-            lines_used = 0
-            local_i = current_index
-            while local_i < total_segments and lines_used < max_lines_per_page:
-                s = segments[local_i]
-                if s.get("page_always_new"):
-                    break
-                lines_used += 1
-                local_i += 1
-            text_pages += 1
-            current_index = local_i
-    exhibit_pages_est = 0
-    if exhibits:
-        exhibit_pages_est = len(exhibits)
-    total_pages_est = text_pages + exhibit_pages_est * 2
-    page_number = 1
-    current_index = 0
-    while current_index < total_segments:
-        next_index = draw_page_of_segments(
-            pdf_canvas=pdf_canvas,
-            page_width=page_width,
-            page_height=page_height,
-            segments=segments,
-            start_index=current_index,
-            max_lines_per_page=max_lines_per_page,
-            firm_name=firm_name,
-            case_name=case_name,
-            page_number=page_number,
-            total_pages=total_pages_est,
-            line_offset_x=line_offset_x,
-            line_offset_y=line_offset_y,
-            line_spacing=line_spacing,
-            heading_positions=heading_positions
+            main_part.append(line)
+    return "\n".join(main_part), "\n".join(exhibits_part)
+
+def dry_run_layout(raw_text, exhibit_images=None):
+    exhibit_images = exhibit_images or []
+    main_text, exhibit_text_after_1 = separate_after_exhibit_1(raw_text)
+    text_exhibits_od = parse_exhibits_from_text(exhibit_text_after_1)
+    header_od, sections_od, section_tree = parse_header_and_sections(main_text)
+    exhibits = []
+    for position, ex_key in enumerate(sorted(text_exhibits_od.keys(), key=lambda x: int(x))):
+        image_path = exhibit_images[position] if position < len(exhibit_images) else ""
+        exhibits.append((text_exhibits_od[ex_key], image_path))
+    layout = layout_complaint(header_od, sections_od, section_tree)
+    body_pages = len(layout["pages"])
+    exhibit_spans = layout_exhibits(exhibits, body_pages + 1, layout["line_spacing"])
+    return OrderedDict([
+        ("total_pages", exhibit_spans[-1]["last_page"] if exhibit_spans else body_pages),
+        ("body_pages", body_pages),
+        ("sections", [
+            OrderedDict([("title", title), ("first_page", first_page), ("last_page", last_page)])
+            for title, first_page, last_page in locate_sections(layout["segments"], layout["pages"])
+        ]),
+        ("exhibits", exhibit_spans),
+        ("headings", [
+            OrderedDict([("text", text), ("page", page), ("line", line), ("is_subheading", is_sub)])
+            for text, page, line, is_sub in filter_headings_for_toc(layout["heading_positions"])
+        ])
+    ])
+
+def hash_file_into(digest, path):
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+
+@traced("run_cache.key")
+def compute_run_cache_key(args):
+    digest = hashlib.sha256()
+    digest.update(GENERATOR_VERSION.encode("utf-8"))
+    source_dir = os.path.dirname(os.path.abspath(__file__))
+    for source_name in (os.path.basename(__file__),) + RUN_CACHE_SOURCES:
+        source_path = os.path.join(source_dir, source_name)
+        digest.update(b"\0" + source_name.encode("utf-8") + b"\0")
+        if os.path.isfile(source_path):
+            hash_file_into(digest, source_path)
+    settings = {
+        "case": args.case,
+        "firm_name": args.firm_name,
+        "output": args.output,
+        "index": args.index,
+        "pickle": args.pickle,
+        "image_dpi": args.image_dpi,
+        "image_quality": args.image_quality,
+        "distinctive_names": args.distinctive_names,
+        "bundle": bool(args.bundle or args.bundle_merge),
+        "bundle_merge": args.bundle_merge,
+        "max_volume_pages": args.max_volume_pages,
+        "max_volume_mb": args.max_volume_mb,
+        "combined": args.combined,
+        "artifact_store": os.path.abspath(args.artifact_store) if args.artifact_store else None,
+        "exhibit_count": len(args.exhibits or []),
+        "reply_count": len(args.reply or [])
+    }
+    digest.update(json.dumps(settings, sort_keys=True).encode("utf-8"))
+    for path in [args.file] + list(args.exhibits or []) + list(args.reply or []):
+        digest.update(b"\0")
+        if os.path.isfile(path):
+            hash_file_into(digest, path)
+        else:
+            digest.update(b"missing:" + path.encode("utf-8"))
+    return digest.hexdigest()
+
+def ensure_run_cache_table(db_conn):
+    db_conn.execute("""
+        CREATE TABLE IF NOT EXISTS run_cache (
+            cache_key TEXT PRIMARY KEY,
+            creation_date TEXT,
+            artifacts TEXT
         )
-        pdf_canvas.showPage()
-        page_number += 1
-        current_index = next_index
+    """)
 
-    idx = 0
-    for ex_content, image_path in exhibits:
-        idx += 1
-        exhibit_label = f"EXHIBIT {idx}:"
-        page_number = draw_exhibit_text(
-            pdf_canvas=pdf_canvas,
-            page_width=page_width,
-            page_height=page_height,
-            firm_name=firm_name,
-            case_name=case_name,
-            exhibit_text=ex_content,
-            exhibit_label=exhibit_label,
-            page_number=page_number,
-            total_pages=total_pages_est,
-            font_name="Helvetica",
-            font_size=10,
-            line_spacing=line_spacing
+def lookup_run_cache(cache_key, db_conn):
+    ensure_run_cache_table(db_conn)
+    row = db_conn.execute(
+        "SELECT creation_date, artifacts FROM run_cache WHERE cache_key = ?",
+        (cache_key,)
+    ).fetchone()
+    if not row:
+        return None
+    artifacts = json.loads(row[1])
+    if not all(os.path.exists(path) for path in artifacts.values() if path):
+        return None
+    return row[0], artifacts
+
+def store_run_cache(cache_key, artifacts, db_conn):
+    ensure_run_cache_table(db_conn)
+    db_conn.execute(
+        "INSERT OR REPLACE INTO run_cache (cache_key, creation_date, artifacts) VALUES (?, ?, ?)",
+        (cache_key, datetime.datetime.now().isoformat(), json.dumps(artifacts))
+    )
+    db_conn.commit()
+
+def print_generated_artifacts(artifacts):
+    print(f"PDF generated (exhibits + pre-exhibit content): {artifacts['complaint_pdf']}")
+    print(f"DOCX Complaint generated: {artifacts['complaint_docx']}")
+    print(f"Index PDF generated: {artifacts['index_pdf']}")
+    print(f"Index DOCX generated: {artifacts['index_docx']}")
+    for name, path in artifacts.items():
+        if name not in ("complaint_pdf", "complaint_docx", "index_pdf", "index_docx", "pickle"):
+            print(f"{name} generated: {path}")
+    print(f"Lawsuit object saved to: {artifacts['pickle'] or 'Not saved (not requested).'}\n")
+
+VOLUME_BASE_BYTES = 6 * 1024
+PAGE_BASE_BYTES = 600
+LINE_OVERHEAD_BYTES = 40
+COMPRESSED_TEXT_RATIO = 0.6
+A85_IMAGE_RATIO = 1.25
+
+def estimate_page_bytes(page, segments, exhibit_image, volume_images):
+    if page["kind"] == "body":
+        text_bytes = sum(len(segments[i].get("text", "")) + LINE_OVERHEAD_BYTES for i in range(page["start"], page["end"]))
+        return PAGE_BASE_BYTES + int(text_bytes * COMPRESSED_TEXT_RATIO)
+    if page["kind"] == "exhibit_text":
+        text_bytes = sum(len(line) + LINE_OVERHEAD_BYTES for line in page["lines"])
+        return PAGE_BASE_BYTES + int(text_bytes * COMPRESSED_TEXT_RATIO)
+    if not exhibit_image or exhibit_image.get("error") or exhibit_image["path"] in volume_images:
+        return PAGE_BASE_BYTES
+    try:
+        return PAGE_BASE_BYTES + int(os.path.getsize(exhibit_image["path"]) * A85_IMAGE_RATIO)
+    except OSError:
+        return PAGE_BASE_BYTES
+
+def volume_filename(output_filename, volume_number):
+    base, ext = os.path.splitext(output_filename)
+    return f"{base}_vol{volume_number}{ext}"
+
+def volume_record(volume_number, path, page_numbers):
+    return {
+        "volume": volume_number,
+        "path": path,
+        "first_page": page_numbers[0] if page_numbers else None,
+        "last_page": page_numbers[-1] if page_numbers else None,
+        "bytes": os.path.getsize(path) if isinstance(path, str) and os.path.exists(path) else None
+    }
+
+def open_document_canvas(output_filename, firm_name, case_name):
+    pdf_canvas = canvas.Canvas(output_filename, pagesize=letter, invariant=1)
+    pdf_canvas.setTitle("Legal Document without Cover Sheet")
+    pdf_canvas.setAuthor(firm_name)
+    pdf_canvas.setSubject(case_name)
+    pdf_canvas.setCreator("Legal PDF Generator")
+    return pdf_canvas
+
+@traced("complaint_pdf")
+def generate_legal_document(
+    firm_name,
+    case_name,
+    output_filename,
+    header_od,
+    sections_od,
+    exhibits,
+    heading_positions,
+    write_docx=True,
+    layout=None,
+    image_dpi=150,
+    image_quality=85,
+    image_cache_dir=".exhibit_cache",
+    image_workers=None,
+    prepared_images=None,
+    page_selection=None,
+    prepared_by_path=None,
+    max_volume_pages=None,
+    max_volume_bytes=None,
+    volumes=None,
+    toc_positions=None,
+    section_tree=None
+):
+    page_width, page_height = letter
+    split_volumes = bool(max_volume_pages or max_volume_bytes)
+    if split_volumes and toc_positions is not None:
+        raise ValueError("A combined filing with a linked table of contents cannot be split into volumes")
+    volume_number = 1
+    volume_path = volume_filename(output_filename, volume_number) if split_volumes else output_filename
+    pdf_canvas = open_document_canvas(volume_path, firm_name, case_name)
+
+    if layout is None:
+        layout = layout_complaint(header_od, sections_od, section_tree)
+    heading_positions.extend(layout["heading_positions"])
+    segments = layout["segments"]
+    line_spacing = layout["line_spacing"]
+    page_plan = plan_document_pages(layout, exhibits)
+    total_pages = len(page_plan)
+    metrics = PageMetrics(firm_name, case_name, total_pages)
+    outlines_by_page = {}
+    for outline_index, (outline_title, outline_page, y_top, level) in enumerate(layout["outline_entries"]):
+        outlines_by_page.setdefault(outline_page, []).append((f"heading_{outline_index}", outline_title, y_top, level))
+    outline_level = -1
+    if page_selection is None:
+        selected_pages = list(enumerate(page_plan, start=1))
+    else:
+        selected_pages = [(page_number, page_plan[page_number - 1]) for page_number in selected_page_numbers(page_selection, total_pages)]
+
+    if prepared_images is None:
+        prepared_images = []
+    if prepared_by_path is None:
+        available_width, available_height = exhibit_image_area(page_width, page_height)
+        prepared_by_path = prepare_exhibit_images(
+            [page["image_path"] for _, page in selected_pages if page["kind"] == "exhibit_image"],
+            available_width,
+            available_height,
+            target_dpi=image_dpi,
+            jpeg_quality=image_quality,
+            cache_dir=image_cache_dir,
+            max_workers=image_workers
         )
-        pdf_canvas.setFont("Helvetica-Oblique", 9)
-        footer_text = f"Page {page_number} of {total_pages_est}"
-        pdf_canvas.drawCentredString(page_width / 2.0, 0.4 * inch, footer_text)
-        pdf_canvas.showPage()
-        page_number += 1
-        if image_path:
-            draw_exhibit_image(
+    toc_targets_by_page = {}
+    if toc_positions is not None:
+        body_pages = set(page_number for page_number, page in selected_pages if page["kind"] == "body")
+        link_keys = OrderedDict()
+        for _heading_text, pg_num, ln_num, _is_sub in toc_positions:
+            if pg_num in body_pages and ln_num is not None and (pg_num, ln_num) not in link_keys:
+                link_keys[(pg_num, ln_num)] = f"toc_{pg_num}_{ln_num}"
+                toc_targets_by_page.setdefault(pg_num, []).append((link_keys[(pg_num, ln_num)], ln_num))
+        pdf_canvas.bookmarkPage("table_of_contents")
+        pdf_canvas.addOutlineEntry("Table of Contents", "table_of_contents", level=0)
+        outline_level = 0
+        with span("combined.toc"):
+            draw_index_pages(pdf_canvas, firm_name, case_name, toc_positions, link_keys=link_keys)
+    if volumes is None:
+        volumes = []
+    volume_pages = []
+    volume_bytes = VOLUME_BASE_BYTES
+    volume_images = set()
+    for page_number, page in selected_pages:
+        exhibit_image = prepared_by_path[page["image_path"]] if page["kind"] == "exhibit_image" else None
+        page_bytes = estimate_page_bytes(page, segments, exhibit_image, volume_images)
+        if volume_pages and (
+            (max_volume_pages and len(volume_pages) >= max_volume_pages)
+            or (max_volume_bytes and volume_bytes + page_bytes > max_volume_bytes)
+        ):
+            with span("complaint_pdf.save"):
+                pdf_canvas.save()
+            volumes.append(volume_record(volume_number, volume_path, volume_pages))
+            volume_number += 1
+            volume_path = volume_filename(output_filename, volume_number)
+            pdf_canvas = open_document_canvas(volume_path, firm_name, case_name)
+            outline_level = -1
+            volume_pages = []
+            volume_bytes = VOLUME_BASE_BYTES
+            volume_images = set()
+            page_bytes = estimate_page_bytes(page, segments, exhibit_image, volume_images)
+        if exhibit_image and exhibit_image.get("path"):
+            volume_images.add(exhibit_image["path"])
+        volume_pages.append(page_number)
+        volume_bytes += page_bytes
+        if page["kind"] == "body":
+            draw_page_of_segments(
+                pdf_canvas=pdf_canvas,
+                page_width=page_width,
+                page_height=page_height,
+                segments=segments,
+                start_index=page["start"],
+                end_index=page["end"],
+                metrics=metrics,
+                page_number=page_number,
+                line_offset_x=layout["line_offset_x"],
+                line_offset_y=layout["line_offset_y"],
+                line_spacing=line_spacing
+            )
+            for link_key, ln_num in toc_targets_by_page.get(page_number, []):
+                y_top = layout["line_offset_y"] - (ln_num - 1 - page["start"]) * line_spacing + line_spacing
+                pdf_canvas.bookmarkHorizontal(link_key, 0, y_top)
+            for outline_key, outline_title, y_top, level in outlines_by_page.get(page_number, []):
+                level = min(level, outline_level + 1)
+                outline_level = level
+                pdf_canvas.bookmarkHorizontal(outline_key, 0, y_top)
+                pdf_canvas.addOutlineEntry(outline_title, outline_key, level=level)
+        elif page["kind"] == "exhibit_text":
+            draw_exhibit_text(
                 pdf_canvas=pdf_canvas,
                 page_width=page_width,
                 page_height=page_height,
-                firm_name=firm_name,
-                case_name=case_name,
-                image_path=image_path,
+                metrics=metrics,
+                text_lines=page["lines"],
+                exhibit_label=f"EXHIBIT {page['exhibit']}:",
                 page_number=page_number,
-                total_pages=total_pages_est
+                font_name="Helvetica",
+                font_size=10,
+                line_spacing=line_spacing
+            )
+        else:
+            prepared_images.append(exhibit_image)
+            draw_exhibit_image(
+                pdf_canvas=pdf_canvas,
+                page_width=page_width,
+                page_height=page_height,
+                metrics=metrics,
+                exhibit_image=exhibit_image,
+                page_number=page_number
             )
-            pdf_canvas.showPage()
-            page_number += 1
+        pdf_canvas.showPage()
 
-    pdf_canvas.save()
-    generate_complaint_docx(
-        docx_filename=os.path.splitext(output_filename)[0] + ".docx",
-        firm_name=firm_name,
-        case_name=case_name,
-        header_od=header_od,
-        sections_od=sections_od,
-        heading_styles=heading_styles
-    )
+    with span("complaint_pdf.save"):
+        pdf_canvas.save()
+    volumes.append(volume_record(volume_number, volume_path, volume_pages))
+    if write_docx:
+        generate_complaint_docx(
+            docx_filename=os.path.splitext(output_filename)[0] + ".docx",
+            firm_name=firm_name,
+            case_name=case_name,
+            header_od=header_od,
+            sections_od=sections_od,
+            heading_styles=layout["heading_styles"]
+        )
+    return heading_positions
 
 def filter_headings_for_toc(heading_positions):
     new_positions = []
@@ -1245,46 +2261,342 @@ def filter_headings_for_toc(heading_positions):
             found_exhibit = True
     return new_positions
 
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--firm_name", default="PDFSage Inc.")
-    parser.add_argument("--case", required=True)
-    parser.add_argument("--output", default="lawsuit.pdf")
-    parser.add_argument("--file", required=True)
-    parser.add_argument("--index", default="index.pdf")
-    parser.add_argument("--pickle", nargs='?', const=None)
-    parser.add_argument("--set-case", help="Set the specified case number as active in the database", required=False)
-    parser.add_argument("--reply", nargs='*', help="Reply with advanced analysis if PDF or ZIP is provided")
-    parser.add_argument("--exhibits", nargs='*', help="Optional image paths for exhibits")
-    args = parser.parse_args()
+def render_complaint_pdf(
+    firm_name,
+    case_name,
+    output_filename,
+    header_od,
+    sections_od,
+    exhibits,
+    layout,
+    image_dpi,
+    image_quality,
+    image_cache_dir,
+    image_workers=None,
+    page_selection=None,
+    prepared_by_path=None,
+    max_volume_pages=None,
+    max_volume_bytes=None,
+    toc_positions=None
+):
+    prepared_images = []
+    volumes = []
+    generate_legal_document(
+        firm_name=firm_name,
+        case_name=case_name,
+        output_filename=output_filename,
+        header_od=header_od,
+        sections_od=sections_od,
+        exhibits=exhibits,
+        heading_positions=[],
+        write_docx=False,
+        layout=layout,
+        image_dpi=image_dpi,
+        image_quality=image_quality,
+        image_cache_dir=image_cache_dir,
+        image_workers=image_workers,
+        prepared_images=prepared_images,
+        page_selection=page_selection,
+        prepared_by_path=prepared_by_path,
+        max_volume_pages=max_volume_pages,
+        max_volume_bytes=max_volume_bytes,
+        volumes=volumes,
+        toc_positions=toc_positions
+    )
+    return {"prepared_images": prepared_images, "volumes": volumes}
+
+def render_volume_index_pdf(index_filename, firm_name, case_name, heading_positions, complaint):
+    generate_index_pdf(index_filename, firm_name, case_name, heading_positions, volumes=complaint["volumes"])
+
+def render_complaint_docx(docx_filename, firm_name, case_name, header_od, sections_od, section_tree):
+    generate_complaint_docx(
+        docx_filename=docx_filename,
+        firm_name=firm_name,
+        case_name=case_name,
+        header_od=header_od,
+        sections_od=sections_od,
+        heading_styles=section_tree.heading_styles()
+    )
+
+def bundle_document_title(document_text, document_number):
+    for line in document_text.splitlines():
+        if line.strip():
+            return line.strip()
+    return f"Document {document_number}"
+
+@traced("bundle.document_pdf")
+def render_bundle_document_pdf(firm_name, case_name, output_filename, title, header_od, sections_od, section_tree):
+    layout = layout_complaint(header_od, sections_od, section_tree)
+    generate_legal_document(
+        firm_name=firm_name,
+        case_name=case_name,
+        output_filename=output_filename,
+        header_od=header_od,
+        sections_od=sections_od,
+        exhibits=[],
+        heading_positions=[],
+        write_docx=False,
+        layout=layout
+    )
+    return {
+        "path": output_filename,
+        "title": title,
+        "pages": len(layout["pages"]),
+        "headings": filter_headings_for_toc(layout["heading_positions"])
+    }
+
+def bundle_index_positions(documents, first_page):
+    heading_positions = []
+    start_page = first_page
+    for document in documents:
+        heading_positions.append((document["title"], start_page, 1, False))
+        for heading_text, pg_num, ln_num, _is_sub in document["headings"]:
+            heading_positions.append((heading_text, start_page + pg_num - 1, ln_num, True))
+        start_page += document["pages"]
+    return heading_positions
+
+def bundle_document_spans(documents, first_page):
+    document_spans = []
+    start_page = first_page
+    for document_number, document in enumerate(documents, start=1):
+        document_spans.append({"document": document_number, "first_page": start_page, "last_page": start_page + document["pages"] - 1})
+        start_page += document["pages"]
+    return document_spans
+
+@traced("bundle_pdf")
+def merge_bundle_pdf(bundle_filename, firm_name, case_name, documents):
+    from PyPDF2 import PdfWriter
+    index_pages = index_page_count(bundle_index_positions(documents, 1))
+    heading_positions = bundle_index_positions(documents, index_pages + 1)
+    index_buffer = io.BytesIO()
+    generate_index_pdf(index_buffer, firm_name, case_name, heading_positions, document_spans=bundle_document_spans(documents, index_pages + 1))
+    index_buffer.seek(0)
+    writer = PdfWriter()
+    writer.append(index_buffer, outline_item="Table of Contents")
+    for document in documents:
+        writer.append(document["path"], outline_item=document["title"])
+    with span("bundle_pdf.save"), open(bundle_filename, "wb") as f:
+        writer.write(f)
+    return {"path": bundle_filename, "pages": len(writer.pages), "index_pages": index_pages}
+
+def bundle_artifact_tasks(documents_od, firm_name, case_name, output_pdf, merge):
+    stem = os.path.splitext(output_pdf)[0]
+    tasks = OrderedDict()
+    artifacts = OrderedDict()
+    for doc_key in documents_od:
+        artifacts[f"document_{doc_key}_pdf"] = f"{stem}_doc{doc_key}.pdf"
+        artifacts[f"document_{doc_key}_docx"] = f"{stem}_doc{doc_key}.docx"
+    for doc_key, doc_text in sorted(documents_od.items(), key=lambda item: len(item[1]), reverse=True):
+        header_od, sections_od, section_tree = parse_header_and_sections(doc_text)
+        document_pdf = artifacts[f"document_{doc_key}_pdf"]
+        document_docx = artifacts[f"document_{doc_key}_docx"]
+        tasks[f"document_{doc_key}_pdf"] = {
+            "func": render_bundle_document_pdf,
+            "kwargs": {
+                "firm_name": firm_name,
+                "case_name": case_name,
+                "output_filename": document_pdf,
+                "title": bundle_document_title(doc_text, doc_key),
+                "header_od": header_od,
+                "sections_od": sections_od,
+                "section_tree": section_tree
+            }
+        }
+        tasks[f"document_{doc_key}_docx"] = {
+            "func": render_complaint_docx,
+            "kwargs": {
+                "docx_filename": document_docx,
+                "firm_name": firm_name,
+                "case_name": case_name,
+                "header_od": header_od,
+                "sections_od": sections_od,
+                "section_tree": section_tree
+            }
+        }
+    if merge and documents_od:
+        bundle_pdf = f"{stem}_bundle.pdf"
+        tasks["bundle_pdf"] = {
+            "func": merge_bundle_pdf,
+            "kwargs": {
+                "bundle_filename": bundle_pdf,
+                "firm_name": firm_name,
+                "case_name": case_name
+            },
+            "deps": {"documents": [f"document_{doc_key}_pdf" for doc_key in documents_od]}
+        }
+        artifacts["bundle_pdf"] = bundle_pdf
+    return tasks, artifacts
+
+def run_artifact_task(name, func, kwargs, parent_pid):
+    mark = event_mark()
+    start = time.perf_counter()
+    with span(f"artifact.{name}"), memory_stage(f"artifact.{name}"):
+        result = func(**kwargs)
+    end = time.perf_counter()
+    events = events_since(mark) if os.getpid() != parent_pid else []
+    return result, start, end, os.getpid(), events
+
+def task_dependencies(task):
+    dep_names = []
+    for dep in task.get("deps", {}).values():
+        dep_names.extend(dep if isinstance(dep, list) else [dep])
+    return dep_names
+
+def resolve_task_kwargs(task, results):
+    kwargs = dict(task["kwargs"])
+    for param_name, dep in task.get("deps", {}).items():
+        kwargs[param_name] = [results[d] for d in dep] if isinstance(dep, list) else results[dep]
+    return kwargs
+
+def run_artifact_graph(artifact_tasks, max_workers=None):
+    results = {}
+    timings = OrderedDict()
+    pending = OrderedDict(artifact_tasks)
+    for name, task in pending.items():
+        for dep_name in task_dependencies(task):
+            if dep_name not in artifact_tasks:
+                raise ValueError(f"Artifact '{name}' depends on unknown artifact '{dep_name}'")
+    if max_workers == 1:
+        while pending:
+            ready = [n for n, t in pending.items() if all(d in results for d in task_dependencies(t))]
+            if not ready:
+                raise ValueError("Artifact dependency cycle among: " + ", ".join(pending))
+            name = ready[0]
+            task = pending.pop(name)
+            result, start, end, pid, _events = run_artifact_task(name, task["func"], resolve_task_kwargs(task, results), os.getpid())
+            results[name] = result
+            timings[name] = (start, end, pid)
+        return results, timings
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=apply_trace_settings, initargs=(trace_settings(),)) as executor:
+        running = {}
+        while pending or running:
+            for name in list(pending):
+                task = pending[name]
+                if all(d in results for d in task_dependencies(task)):
+                    del pending[name]
+                    future = executor.submit(run_artifact_task, name, task["func"], resolve_task_kwargs(task, results), os.getpid())
+                    running[future] = name
+            if not running:
+                raise ValueError("Artifact dependency cycle among: " + ", ".join(pending))
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                result, start, end, pid, events = future.result()
+                add_events(events)
+                results[name] = result
+                timings[name] = (start, end, pid)
+    return results, timings
+
+def print_artifact_timings(timings, wall_start, wall_end):
+    print("Artifact timings:")
+    for name, (start, end, pid) in timings.items():
+        print(f"  {name:<16} {end - start:8.3f}s  (started +{start - wall_start:.3f}s, pid {pid})")
+    serial_total = sum(end - start for start, end, _ in timings.values())
+    print(f"  {'wall clock':<16} {wall_end - wall_start:8.3f}s  (sequential sum {serial_total:.3f}s)\n")
+
+def iter_reply_texts(reply_files):
+    for reply_file in reply_files:
+        ext = os.path.splitext(reply_file)[1].lower()
+        if os.path.isfile(reply_file) and (ext == '.pdf' or ext == '.zip'):
+            if ext == '.pdf':
+                yield read_input_file(reply_file)
+            if ext == '.zip':
+                with zipfile.ZipFile(reply_file, 'r') as z:
+                    for name in z.namelist():
+                        if name.lower().endswith('.pdf'):
+                            from PyPDF2 import PdfReader
+                            with z.open(name) as fpdf:
+                                reader = PdfReader(fpdf)
+                                lines = []
+                                for page in reader.pages:
+                                    text = page.extract_text()
+                                    if text:
+                                        lines.extend(text.splitlines())
+                                yield "\n".join(lines)
+
+RENDER_MEMORY_PER_TEXT_BYTE = 24
+PICKLE_MEMORY_PER_TEXT_BYTE = 3
+
+class MemoryBudget:
+    def __init__(self, budget_mb=None):
+        self.budget_kb = budget_mb * 1024.0 if budget_mb else None
+        self.low_memory = False
+        self.decisions = []
+
+    def exceeded(self, stage, estimated_kb):
+        if self.budget_kb is None:
+            return False
+        projected_kb = current_rss_kb() + estimated_kb
+        if projected_kb > self.budget_kb:
+            self.decisions.append(
+                f"{stage}: projected {projected_kb / 1024.0:.0f} MB exceeds the {self.budget_kb / 1024.0:.0f} MB budget"
+            )
+            self.low_memory = True
+        elif self.low_memory:
+            self.decisions.append(f"{stage}: kept low-memory variant after an earlier stage exceeded the budget")
+        return self.low_memory
+
+def decoded_image_kb(image_path):
+    try:
+        with PILImage.open(image_path) as img:
+            return img.width * img.height * len(img.getbands()) / 1024.0
+    except Exception:
+        return 0.0
+
+def estimate_render_memory_kb(text_length, image_paths, artifact_workers, image_workers):
+    document_kb = text_length * RENDER_MEMORY_PER_TEXT_BYTE / 1024.0
+    image_sizes = sorted((decoded_image_kb(p) for p in image_paths if p), reverse=True)
+    return document_kb * max(1, min(artifact_workers, 4)) + sum(image_sizes[:max(1, image_workers)])
+
+def write_profile(profile_path):
+    if not profile_path:
+        return
+    write_chrome_trace(profile_path)
+    print_trace_summary()
+    print(f"Trace written to {profile_path}\n")
+
+class WatchState:
+    def __init__(self):
+        self.raw_text = None
+        self.parsed = None
+        self.layout = None
+        self.section_cache = {}
+        self.image_memo = {}
+        self.output_names = None
+        self.artifact_inputs = {}
+
+def run_generation(args, db_conn, page_selection=None, memory_budget=None, watch_state=None):
+    run_start = time.perf_counter()
+    if memory_budget is None:
+        memory_budget = MemoryBudget()
+    use_run_cache = watch_state is None and not page_selection
+    run_cache_key = compute_run_cache_key(args) if use_run_cache else None
+    with span("sqlite.run_cache"):
+        cached_run = None if args.rebuild or not use_run_cache else lookup_run_cache(run_cache_key, db_conn)
+    if cached_run:
+        creation_date, artifacts = cached_run
+        print(f"Inputs unchanged since {creation_date}; reusing cached artifacts (use --rebuild to regenerate).\n")
+        if args.set_case:
+            set_active_case(args.set_case, db_conn)
+        print_generated_artifacts(artifacts)
+        write_profile(args.profile)
+        return artifacts
 
     datetime_string = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
     raw_text = read_input_file(args.file)
+    memory_checkpoint("read")
 
     detected_cases = detect_case_numbers(raw_text)
-    db_conn = sqlite3.connect("cases.db")
-    store_detected_cases_in_db(detected_cases, db_conn)
-
-    def separate_after_exhibit_1(full_text):
-        pattern_ex1 = re.compile(r'^\s*EXHIBIT\s+1\s*:', re.IGNORECASE)
-        lines = full_text.splitlines()
-        main_part = []
-        exhibits_part = []
-        found_ex1 = False
-        for line in lines:
-            if not found_ex1 and pattern_ex1.match(line):
-                found_ex1 = True
-                exhibits_part.append(line)
-            elif found_ex1:
-                exhibits_part.append(line)
-            else:
-                main_part.append(line)
-        return "\n".join(main_part), "\n".join(exhibits_part)
-
-    main_text, exhibit_text_after_1 = separate_after_exhibit_1(raw_text)
-    text_exhibits_od = parse_exhibits_from_text(exhibit_text_after_1)
+    if not page_selection:
+        store_detected_cases_in_db(detected_cases, db_conn)
 
-    header_od, sections_od = parse_header_and_sections(main_text)
+    if watch_state is not None and watch_state.raw_text == raw_text:
+        header_od, sections_od, section_tree, text_exhibits_od, found_documents = watch_state.parsed
+    else:
+        main_text, exhibit_text_after_1 = separate_after_exhibit_1(raw_text)
+        text_exhibits_od = parse_exhibits_from_text(exhibit_text_after_1)
+        header_od, sections_od, section_tree = parse_header_and_sections(main_text)
+        found_documents = parse_documents_from_text(raw_text)
 
     exhibits_od = OrderedDict()
     i = 1
@@ -1294,24 +2606,34 @@ def main():
             ('image_path', "")
         ])
         i += 1
+    citations = detect_case_citations(header_od, sections_od, exhibits_od)
 
     header_od["DocumentTitle"] = "Complaint for Tort – Other"
     header_od["DateFiled"] = "2025-02-14"
     header_od["Court"] = "King County Superior Court"
 
-    found_documents = parse_documents_from_text(raw_text)
     documents_od = OrderedDict()
     for idx, doc_text in enumerate(found_documents, start=1):
         documents_od[str(idx)] = doc_text
+    memory_checkpoint("parse")
 
-    args.output = generate_smart_filename(args.output, raw_text, datetime_string)
-    args.index = generate_smart_filename(args.index, raw_text, datetime_string)
-    if args.pickle is not None:
-        if args.pickle:
-            args.pickle = generate_smart_filename(args.pickle, raw_text, datetime_string)
-        else:
-            default_pickle = f"lawsuit.pickle"
-            args.pickle = generate_smart_filename(default_pickle, raw_text, datetime_string)
+    if watch_state is not None and watch_state.output_names:
+        output_pdf, index_pdf, pickle_path = watch_state.output_names
+    else:
+        if not page_selection:
+            update_keyword_document_frequency(raw_text, db_conn)
+        keyword_db = db_conn if args.distinctive_names else None
+        output_pdf = generate_smart_filename(args.output, raw_text, datetime_string, db_conn=keyword_db)
+        index_pdf = generate_smart_filename(args.index, raw_text, datetime_string, db_conn=keyword_db)
+        pickle_path = None
+        if args.pickle is not None:
+            if args.pickle:
+                pickle_path = generate_smart_filename(args.pickle, raw_text, datetime_string, db_conn=keyword_db)
+            else:
+                default_pickle = f"lawsuit.pickle"
+                pickle_path = generate_smart_filename(default_pickle, raw_text, datetime_string, db_conn=keyword_db)
+        if watch_state is not None:
+            watch_state.output_names = (output_pdf, index_pdf, pickle_path)
 
     lawsuit_obj = Lawsuit(
         sections=sections_od,
@@ -1330,85 +2652,409 @@ def main():
                 lawsuit_obj.exhibits[ex_key]['image_path'] = ex_image
             i += 1
 
-    store_lawsuit_in_db(lawsuit_obj, db_conn)
-    if args.set_case:
-        set_active_case(args.set_case, db_conn)
+    if not page_selection:
+        spill_pickle = memory_budget.exceeded("store_lawsuit", len(raw_text) * PICKLE_MEMORY_PER_TEXT_BYTE / 1024.0)
+        store_lawsuit_in_db(lawsuit_obj, db_conn, spill_to_disk=spill_pickle, section_tree=section_tree)
+        store_case_citations_in_db(args.case, citations, db_conn)
+        memory_checkpoint("store_lawsuit")
+        if args.set_case:
+            set_active_case(args.set_case, db_conn)
 
     lawsuit_obj.run_deep_legal_analysis()
 
     if args.reply:
-        pdf_file_texts = []
-        for reply_file in args.reply:
-            ext = os.path.splitext(reply_file)[1].lower()
-            if os.path.isfile(reply_file) and (ext == '.pdf' or ext == '.zip'):
-                if ext == '.pdf':
-                    pdf_file_texts.append(read_input_file(reply_file))
-                if ext == '.zip':
-                    import zipfile
-                    with zipfile.ZipFile(reply_file, 'r') as z:
-                        for name in z.namelist():
-                            if name.lower().endswith('.pdf'):
-                                import io
-                                from PyPDF2 import PdfReader
-                                with z.open(name) as fpdf:
-                                    pdf_bytes = fpdf.read()
-                                    pdf_stream = io.BytesIO(pdf_bytes)
-                                    reader = PdfReader(pdf_stream)
-                                    lines = []
-                                    for page in reader.pages:
-                                        text = page.extract_text()
-                                        if text:
-                                            lines.extend(text.splitlines())
-                                    pdf_file_texts.append("\n".join(lines))
-        if pdf_file_texts:
-            lawsuit_obj.run_agi_legal_professionalism(pdf_file_texts)
+        with span("parse.replies"):
+            lawsuit_obj.run_agi_legal_professionalism(iter_reply_texts(args.reply))
+        memory_checkpoint("replies")
 
     exhibits_for_pdf = []
     for _, val in lawsuit_obj.exhibits.items():
         exhibits_for_pdf.append((val["caption"], val["image_path"]))
 
-    heading_positions = []
-    generate_legal_document(
-        firm_name=args.firm_name,
-        case_name=args.case,
-        output_filename=args.output,
-        header_od=header_od,
-        sections_od=sections_od,
-        exhibits=exhibits_for_pdf,
-        heading_positions=heading_positions
-    )
-
-    heading_positions = filter_headings_for_toc(heading_positions)
-    generate_index_pdf(
-        index_filename=args.index,
-        firm_name=args.firm_name,
-        case_name=args.case,
-        heading_positions=heading_positions
-    )
-    index_docx = os.path.splitext(args.index)[0] + ".docx"
-    generate_toc_docx(
-        docx_filename=index_docx,
-        firm_name=args.firm_name,
-        case_name=args.case,
-        heading_positions=heading_positions
-    )
-
-    if args.pickle is not None:
-        with open(args.pickle, "wb") as pf:
-            pickle.dump(lawsuit_obj, pf)
-        pkl_path = args.pickle
+    if watch_state is None:
+        layout = layout_complaint(header_od, sections_od, section_tree)
+    elif watch_state.raw_text == raw_text:
+        layout = watch_state.layout
     else:
-        pkl_path = "Not saved (not requested)."
+        layout = layout_complaint(header_od, sections_od, section_tree, section_cache=watch_state.section_cache)
+    if watch_state is not None:
+        watch_state.raw_text = raw_text
+        watch_state.parsed = (header_od, sections_od, section_tree, text_exhibits_od, found_documents)
+        watch_state.layout = layout
+    heading_positions = filter_headings_for_toc(layout["heading_positions"])
+    memory_checkpoint("layout")
+    prepared_by_path = None
+    if watch_state is not None:
+        available_width, available_height = exhibit_image_area(*letter)
+        prepared_by_path = prepare_exhibit_images(
+            [image_path for _, image_path in exhibits_for_pdf],
+            available_width,
+            available_height,
+            target_dpi=args.image_dpi,
+            jpeg_quality=args.image_quality,
+            cache_dir=args.image_cache,
+            memo=watch_state.image_memo
+        )
+    if page_selection:
+        total_pages = len(plan_document_pages(layout, exhibits_for_pdf))
+        preview_pages = selected_page_numbers(page_selection, total_pages)
+        preview_output = f"{os.path.splitext(output_pdf)[0]}_pages_{args.pages.replace(',', '_')}.pdf"
+        preview = render_complaint_pdf(
+            firm_name=args.firm_name,
+            case_name=args.case,
+            output_filename=preview_output,
+            header_od=header_od,
+            sections_od=sections_od,
+            exhibits=exhibits_for_pdf,
+            layout=layout,
+            image_dpi=args.image_dpi,
+            image_quality=args.image_quality,
+            image_cache_dir=args.image_cache,
+            page_selection=page_selection,
+            prepared_by_path=prepared_by_path
+        )
+        print(f"Preview of {len(preview_pages)} of {total_pages} pages ({args.pages}) generated: {preview_output}\n")
+        print_image_report(preview["prepared_images"])
+        write_profile(args.profile)
+        return OrderedDict([("complaint_pdf", preview_output)])
+    artifact_workers = args.workers
+    image_workers = None
+    image_paths = [image_path for _, image_path in exhibits_for_pdf if image_path]
+    render_estimate_kb = estimate_render_memory_kb(len(raw_text), image_paths, artifact_workers, min(4, len(image_paths)))
+    if memory_budget.exceeded("render", render_estimate_kb):
+        artifact_workers = 1
+        image_workers = 1
+    complaint_docx = os.path.splitext(output_pdf)[0] + ".docx"
+    index_docx = os.path.splitext(index_pdf)[0] + ".docx"
+    max_volume_bytes = int(args.max_volume_mb * 1024 * 1024) if args.max_volume_mb else None
+    split_volumes = bool(args.max_volume_pages or max_volume_bytes)
+    artifact_tasks = OrderedDict([
+        ("complaint_pdf", {
+            "func": render_complaint_pdf,
+            "kwargs": {
+                "firm_name": args.firm_name,
+                "case_name": args.case,
+                "output_filename": output_pdf,
+                "header_od": header_od,
+                "sections_od": sections_od,
+                "exhibits": exhibits_for_pdf,
+                "layout": layout,
+                "image_dpi": args.image_dpi,
+                "image_quality": args.image_quality,
+                "image_cache_dir": args.image_cache,
+                "image_workers": image_workers,
+                "prepared_by_path": prepared_by_path,
+                "max_volume_pages": args.max_volume_pages,
+                "max_volume_bytes": max_volume_bytes
+            }
+        }),
+        ("complaint_docx", {
+            "func": render_complaint_docx,
+            "kwargs": {
+                "docx_filename": complaint_docx,
+                "firm_name": args.firm_name,
+                "case_name": args.case,
+                "header_od": header_od,
+                "sections_od": sections_od,
+                "section_tree": section_tree
+            }
+        }),
+        ("index_pdf", {
+            "func": generate_index_pdf,
+            "kwargs": {
+                "index_filename": index_pdf,
+                "firm_name": args.firm_name,
+                "case_name": args.case,
+                "heading_positions": heading_positions
+            }
+        }),
+        ("index_docx", {
+            "func": generate_toc_docx,
+            "kwargs": {
+                "docx_filename": index_docx,
+                "firm_name": args.firm_name,
+                "case_name": args.case,
+                "heading_positions": heading_positions
+            }
+        })
+    ])
+    if args.combined:
+        combined_pdf = os.path.splitext(output_pdf)[0] + "_filing.pdf"
+        artifact_tasks["combined_pdf"] = {
+            "func": render_complaint_pdf,
+            "kwargs": dict(
+                artifact_tasks["complaint_pdf"]["kwargs"],
+                output_filename=combined_pdf,
+                max_volume_pages=None,
+                max_volume_bytes=None,
+                toc_positions=heading_positions
+            )
+        }
+    if split_volumes:
+        artifact_tasks["index_pdf"]["func"] = render_volume_index_pdf
+        artifact_tasks["index_pdf"]["deps"] = {"complaint": "complaint_pdf"}
+    artifacts = OrderedDict([
+        ("complaint_pdf", volume_filename(output_pdf, 1) if split_volumes else output_pdf),
+        ("complaint_docx", complaint_docx),
+        ("index_pdf", index_pdf),
+        ("index_docx", index_docx),
+        ("pickle", pickle_path)
+    ])
+    if args.combined:
+        artifacts["combined_pdf"] = combined_pdf
+    if args.bundle or args.bundle_merge:
+        if not documents_od:
+            print("Bundle mode: no ====/---- delimited documents found in the input.\n")
+        bundle_tasks, bundle_artifacts = bundle_artifact_tasks(
+            documents_od,
+            firm_name=args.firm_name,
+            case_name=args.case,
+            output_pdf=output_pdf,
+            merge=args.bundle_merge
+        )
+        artifact_tasks.update(bundle_tasks)
+        artifacts.update(bundle_artifacts)
+    if watch_state is not None:
+        text_fingerprint = content_hash(raw_text)
+        image_fingerprint = tuple((p, prepared.get("digest")) for p, prepared in prepared_by_path.items())
+        artifact_inputs = {
+            "complaint_pdf": (text_fingerprint, image_fingerprint),
+            "combined_pdf": (text_fingerprint, image_fingerprint),
+            "complaint_docx": text_fingerprint,
+            "index_pdf": text_fingerprint,
+            "index_docx": text_fingerprint
+        }
+        for name in artifact_tasks:
+            artifact_inputs.setdefault(name, text_fingerprint)
+        unchanged = set(
+            name for name in artifact_tasks
+            if watch_state.artifact_inputs.get(name) == artifact_inputs[name] and os.path.exists(artifacts[name])
+        )
+        rescheduled = True
+        while rescheduled:
+            rescheduled = False
+            for name, task in artifact_tasks.items():
+                dep_names = set(task_dependencies(task))
+                if name in unchanged and not dep_names <= unchanged:
+                    unchanged.discard(name)
+                    rescheduled = True
+                elif name not in unchanged and dep_names & unchanged:
+                    unchanged.difference_update(dep_names)
+                    rescheduled = True
+        for name in unchanged:
+            del artifact_tasks[name]
+        watch_state.artifact_inputs.update(artifact_inputs)
+    wall_start = time.perf_counter()
+    try:
+        artifact_results, artifact_timings = run_artifact_graph(artifact_tasks, max_workers=artifact_workers)
+    except (BrokenProcessPool, MemoryError):
+        if memory_budget.budget_kb is None or artifact_workers == 1:
+            raise
+        memory_budget.decisions.append("render: worker pool ran out of memory; retried sequentially")
+        memory_budget.low_memory = True
+        artifact_tasks["complaint_pdf"]["kwargs"]["image_workers"] = 1
+        artifact_results, artifact_timings = run_artifact_graph(artifact_tasks, max_workers=1)
+    wall_end = time.perf_counter()
+    if split_volumes and "complaint_pdf" in artifact_results:
+        volume_artifacts = OrderedDict()
+        for name, path in artifacts.items():
+            volume_artifacts[name] = path
+            if name == "complaint_pdf":
+                for volume in artifact_results["complaint_pdf"]["volumes"][1:]:
+                    volume_artifacts[f"complaint_pdf_vol{volume['volume']}"] = volume["path"]
+        artifacts = volume_artifacts
+
+    if pickle_path is not None:
+        with span("pickle"), open(pickle_path, "wb") as pf:
+            pickle.dump(lawsuit_obj, pf)
+        memory_checkpoint("pickle")
+
+    if args.artifact_store:
+        with span("artifact_store"):
+            for artifact_path in artifacts.values():
+                if artifact_path:
+                    store_artifact(artifact_path, args.artifact_store, args.case, datetime_string, db_conn)
+    if use_run_cache:
+        with span("sqlite.run_cache"):
+            store_run_cache(run_cache_key, artifacts, db_conn)
+    print_generated_artifacts(artifacts)
+    print_artifact_timings(artifact_timings, wall_start, wall_end)
+    if "complaint_pdf" in artifact_results:
+        print_image_report(artifact_results["complaint_pdf"]["prepared_images"])
+        if split_volumes:
+            print_volume_report(artifact_results["complaint_pdf"]["volumes"], max_volume_bytes)
+    if memory_budget.low_memory:
+        print("Memory budget: switched to low-memory variants")
+        for decision in memory_budget.decisions:
+            print(f"  {decision}")
+        print()
+    if args.memory_report:
+        print_memory_summary()
+        print()
+    write_profile(args.profile)
+    if watch_state is None:
+        print_lawsuit_dump(lawsuit_obj, args.dump, artifacts, artifact_timings, time.perf_counter() - run_start)
+    return artifacts
+
+def run_summary(lawsuit_obj, artifacts, artifact_timings, run_seconds):
+    summary = lawsuit_obj.summary()
+    summary["run_seconds"] = round(run_seconds, 3)
+    summary["artifacts"] = OrderedDict()
+    for name, path in artifacts.items():
+        if not path:
+            continue
+        start, end, _pid = artifact_timings.get(name, (None, None, None))
+        summary["artifacts"][name] = OrderedDict([
+            ("path", path),
+            ("bytes", os.path.getsize(path) if os.path.exists(path) else None),
+            ("seconds", round(end - start, 3) if start is not None else None)
+        ])
+    return summary
+
+def print_lawsuit_dump(lawsuit_obj, mode, artifacts, artifact_timings, run_seconds):
+    if mode == "none":
+        return
+    if mode == "full":
+        print("Dumped Lawsuit object:")
+        lawsuit_obj.write_dump(sys.stdout)
+        print()
+        return
+    summary = run_summary(lawsuit_obj, artifacts, artifact_timings, run_seconds)
+    if mode == "json":
+        print(json.dumps(summary, indent=2))
+        return
+    print("Lawsuit summary:")
+    print(f"  case: {summary['case']}")
+    print(f"  firm: {summary['firm']}")
+    print(f"  header fields: {summary['header_fields']}")
+    print(f"  sections: {summary['sections']} ({summary['section_chars']} chars)")
+    print(f"  exhibits: {summary['exhibits']} ({summary['exhibit_images']} with images, {summary['exhibit_chars']} chars)")
+    print(f"  documents: {summary['documents']} ({summary['document_chars']} chars)")
+    print(f"  run time: {summary['run_seconds']:.3f}s")
+    for name, artifact in summary["artifacts"].items():
+        size = f"{artifact['bytes'] / 1024:.1f} KB" if artifact["bytes"] is not None else "missing"
+        seconds = f"{artifact['seconds']:.3f}s" if artifact["seconds"] is not None else "-"
+        print(f"  {name:<20} {size:>12} {seconds:>9}  {artifact['path']}")
+    print()
+
+def run_generation_logged(argv, db_path="cases.db", log_path=None):
+    parse_errors = io.StringIO()
+    try:
+        with contextlib.redirect_stderr(parse_errors):
+            args = build_arg_parser().parse_args(argv)
+    except SystemExit:
+        message = parse_errors.getvalue().strip().splitlines()
+        raise ValueError(message[-1] if message else "Invalid generation arguments") from None
+    with open(log_path or os.devnull, "w", encoding="utf-8") as log_file, contextlib.redirect_stdout(log_file):
+        db_conn = sqlite3.connect(db_path, timeout=30)
+        try:
+            return run_generation(args, db_conn)
+        finally:
+            db_conn.close()
+
+def watch_and_regenerate(args, db_conn, page_selection, memory_budget):
+    watch_paths = [args.file] + [p for p in (args.exhibits or []) if p]
+    watcher = open_file_watcher(watch_paths)
+    watch_state = WatchState()
+    run_generation(args, db_conn, page_selection, memory_budget, watch_state)
+    print(f"Watching {len(watch_paths)} input files ({watcher.backend}); press Ctrl+C to stop.\n")
+    try:
+        while True:
+            changed = watcher.wait_for_changes()
+            print("Changed: " + ", ".join(sorted(os.path.basename(p) for p in changed)))
+            start = time.perf_counter()
+            try:
+                run_generation(args, db_conn, page_selection, memory_budget, watch_state)
+            except Exception as e:
+                print(f"Regeneration failed: {e}\n")
+                continue
+            print(f"Regenerated in {time.perf_counter() - start:.3f}s\n")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--firm_name", default="PDFSage Inc.")
+    parser.add_argument("--case", required=True)
+    parser.add_argument("--output", default="lawsuit.pdf")
+    parser.add_argument("--file", required=True)
+    parser.add_argument("--index", default="index.pdf")
+    parser.add_argument("--pickle", nargs='?', const=None)
+    parser.add_argument("--set-case", help="Set the specified case number as active in the database", required=False)
+    parser.add_argument("--reply", nargs='*', help="Reply with advanced analysis if PDF or ZIP is provided")
+    parser.add_argument("--exhibits", nargs='*', help="Optional image paths for exhibits")
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1), help="Worker processes for artifact generation (1 = sequential)")
+    parser.add_argument("--image-dpi", type=int, default=150, help="Downsample exhibit images to this DPI at their placed size (0 = embed originals)")
+    parser.add_argument("--image-quality", type=int, default=85, help="JPEG quality for recompressed exhibit images")
+    parser.add_argument("--image-cache", default=".exhibit_cache", help="Directory for preprocessed exhibit images")
+    parser.add_argument("--distinctive-names", action="store_true", help="Weight filename keywords against the document frequencies stored in cases.db")
+    parser.add_argument("--artifact-store", help="Move outputs into this content-addressed store and leave symlinks at the output paths")
+    parser.add_argument("--rebuild", action="store_true", help="Ignore the run cache and regenerate every artifact")
+    parser.add_argument("--profile", help="Write a Chrome/Perfetto trace of pipeline stages to this JSON file")
+    parser.add_argument("--memory-report", action="store_true", help="Record tracemalloc peaks and RSS per pipeline stage (slows rendering)")
+    parser.add_argument("--pages", help="Lay out the whole filing but draw only these complaint PDF pages, e.g. 12-18 or 1,4-6 (previews are not recorded in cases.db)")
+    parser.add_argument("--dry-run-layout", nargs='?', const="-", help="Only parse and paginate; write a JSON layout report to this path (default stdout)")
+    parser.add_argument("--watch", action="store_true", help="Stay resident and regenerate when the input file or exhibit images change")
+    parser.add_argument("--memory-budget", type=float, help="Memory budget in MB; switches to low-memory variants when a stage would exceed it")
+    parser.add_argument("--max-volume-pages", type=int, help="Split the complaint PDF into volumes of at most this many pages")
+    parser.add_argument("--max-volume-mb", type=float, help="Split the complaint PDF into volumes of at most this many MB (e-filing upload caps)")
+    parser.add_argument("--dump", choices=["summary", "json", "full", "none"], default="summary", help="What to print about the Lawsuit object after a run: counts and artifacts, the same as JSON, a streamed full dump, or nothing")
+    parser.add_argument("--combined", action="store_true", help="Also write one filing PDF with linked table of contents, complaint and exhibits in a single pass")
+    parser.add_argument("--bundle", action="store_true", help="Also render each ====/---- delimited document as its own PDF/DOCX pair in the worker pool")
+    parser.add_argument("--bundle-merge", action="store_true", help="Like --bundle, and merge the document PDFs into one bundle PDF behind a combined index")
+    return parser
 
-    print(f"PDF generated (exhibits + pre-exhibit content): {args.output}")
-    print(f"DOCX Complaint generated: {os.path.splitext(args.output)[0] + '.docx'}")
-    print(f"Index PDF generated: {args.index}")
-    print(f"Index DOCX generated: {index_docx}")
-    print(f"Lawsuit object saved to: {pkl_path}\n")
-    print("Dumped Lawsuit object:")
-    print(lawsuit_obj)
+def main():
+    parser = build_arg_parser()
+    args = parser.parse_args()
+    if args.profile:
+        enable_tracing()
+    if args.watch and args.artifact_store:
+        parser.error("--watch cannot be combined with --artifact-store")
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.max_volume_pages is not None and args.max_volume_pages < 1:
+        parser.error("--max-volume-pages must be at least 1")
+    if args.max_volume_mb is not None and args.max_volume_mb <= 0:
+        parser.error("--max-volume-mb must be positive")
+    if args.combined and (args.max_volume_pages or args.max_volume_mb):
+        parser.error("--combined cannot be split into volumes; its table of contents links within one file")
+    page_selection = None
+    if args.pages and (args.combined or args.bundle or args.bundle_merge):
+        parser.error("--pages previews only the complaint PDF; drop --combined, --bundle and --bundle-merge")
+    if args.pages and (args.max_volume_pages or args.max_volume_mb):
+        parser.error("--pages cannot be combined with --max-volume-pages or --max-volume-mb")
+    if args.pages:
+        try:
+            page_selection = parse_page_ranges(args.pages)
+        except ValueError as e:
+            parser.error(str(e))
+    if args.dry_run_layout:
+        layout_report = json.dumps(dry_run_layout(read_input_file(args.file), args.exhibits), indent=2)
+        if args.dry_run_layout == "-":
+            print(layout_report)
+        else:
+            with open(args.dry_run_layout, "w", encoding="utf-8") as f:
+                f.write(layout_report + "\n")
+            print(f"Layout report written to {args.dry_run_layout}")
+        write_profile(args.profile)
+        return
+    memory_budget = MemoryBudget(args.memory_budget)
+    if args.memory_report or args.memory_budget:
+        enable_memory_tracking(use_tracemalloc=args.memory_report)
 
-    db_conn.close()
+    db_conn = sqlite3.connect("cases.db")
+    try:
+        if args.watch:
+            watch_and_regenerate(args, db_conn, page_selection, memory_budget)
+        else:
+            run_generation(args, db_conn, page_selection, memory_budget)
+    except PageSelectionError as e:
+        parser.error(f"--pages: {e}")
+    finally:
+        db_conn.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file